@@ -1,100 +1,221 @@
 import json
+import re
 import time
 import requests
 from config import settings
+from ratelimit import get_limiter
+from llm_cache import get_llm_cache, cache_key, cacheable
+from ollama_client import get_ollama_client
+from jsonstream import JsonStream
 from log import section, kv, block, trunc, enabled
 
-def _extract_first_json_object(s: str) -> str | None:
-    if not s:
-        return None
-    start = s.find("{")
-    if start == -1:
-        return None
+# opțiunile de generare trimise la Ollama (fac parte și din cheia de cache)
+GENERATE_OPTIONS = {"temperature": 0, "top_p": 0.9}
+
+# la un hit din cache, textul se re-trimite prin stream_cb în bucăți de atâtea caractere
+CACHE_REPLAY_CHUNK = 64
+
+
+def _after_think(text: str) -> str | None:
+    """Textul de după blocul <think>; None cât timp blocul nu s-a închis."""
+    if "<think>" not in text:
+        return text
+    end = text.find("</think>")
+    return None if end == -1 else text[end + len("</think>"):]
+
+
+def _word_complete(parts: list[str], chunk: str) -> bool:
+    if not any(c.isspace() for c in chunk):
+        return False
+    t = _after_think("".join(parts))
+    return t is not None and re.match(r"\s*\S+\s", t) is not None
+
+
+class AnswerCap:
+    """
+    Plafon de tokeni numărat doar după </think>: cu raționamentul pornit, un
+    num_predict trimis la Ollama s-ar putea consuma tot în <think>, înainte de JSON.
+    feed(chunk) -> True când răspunsul a depășit plafonul (stream-ul se închide).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.mode = None  # None (încă nimic) | think | answer
+        self.tail = ""
+        self.n = 0
+
+    def feed(self, chunk: str) -> bool:
+        if self.mode is None:
+            head = chunk.lstrip()
+            if not head:
+                return False
+            self.mode = "think" if head.startswith("<think>") or "<think>".startswith(head) else "answer"
+        if self.mode == "think":
+            tail = self.tail + chunk
+            self.tail = tail[-len("</think>"):]
+            if "</think>" in tail:
+                self.mode = "answer"
+            return False
+        self.n += 1
+        return self.n > self.limit
+
+
+# când se poate opri generarea (client-side): eticheta e completă; pentru "json"
+# decide JsonStream (primul obiect JSON s-a închis)
+EARLY_STOP = {"word": _word_complete}
 
-    depth = 0
-    in_str = False
-    esc = False
-
-    for i in range(start, len(s)):
-        ch = s[i]
-        if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
-            elif ch == '"':
-                in_str = False
-            continue
-
-        if ch == '"':
-            in_str = True
-        elif ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return s[start:i+1]
-    return None
-
-def safe_json(resp: str, fallback: dict):
-    try:
-        return json.loads(resp)
-    except Exception:
-        j = _extract_first_json_object(resp or "")
-        if j:
-            try:
-                return json.loads(j)
-            except Exception:
-                pass
-        return fallback
 
+def call_options(label: str) -> dict:
+    """Controalele de generare pentru un tip de apel (settings.LLM_CALL_OPTIONS)."""
+    return settings.LLM_CALL_OPTIONS.get(label, {})
 
-def ollama_generate(model: str, prompt: str, label: str = "OLLAMA", stream_cb=None):
+
+def answer_format(label: str) -> str:
+    """Instrucțiunea de format pentru prompturile JSON: cu sau fără pasul <think>."""
+    if call_options(label).get("think") is False:
+        return "Răspunde DOAR cu JSON STRICT (fără <think>, fără text extra după JSON)."
+    return """Răspunde în DOUĂ părți, în ordinea exactă:
+
+1) <think> ... </think>  (gândirea ta, liber)
+2) JSON STRICT (fără text extra după JSON)"""
+
+
+def ollama_generate(model: str, prompt: str, label: str = "OLLAMA", stream_cb=None, cache: bool = True,
+                    json_stream: JsonStream | None = None):
     """
     - dacă stream_cb e None: comportament clasic (returnează text complet)
     - dacă stream_cb e setat: stream token-by-token + returnează text complet la final
 
     stream_cb(label, kind, payload)
-      kind: "prompt" | "chunk" | "done" | "error"
+      kind: "prompt" | "chunk" | "field" | "done" | "error"
+
+    json_stream: primește fiecare bucată de output; câmpurile JSON terminate pleacă
+    imediat ca "field" ({"key", "value"}), iar apelantul citește json_stream.value.
+
+    Răspunsurile deterministe se păstrează în llm_cache; un hit se re-joacă prin
+    stream_cb (prompt / chunk / done cu cached=True), fără request la Ollama.
+
+    Endpoint-ul vine din OllamaPool (cel mai liber cu modelul încărcat); la eroare
+    de conexiune se reîncearcă pe alt endpoint.
+
+    Per `label`, din settings.LLM_CALL_OPTIONS: num_predict / stop (opțiuni Ollama),
+    think (raționament on/off) și early_stop ("word" | "json"): stream-ul se închide
+    imediat ce răspunsul util e complet, iar Ollama oprește generarea.
+    num_predict merge la Ollama doar cu think=False; cu raționamentul pornit e un
+    plafon client-side numărat după </think> (AnswerCap). Un endpoint care nu
+    respectă "think" (Ollama < OLLAMA_THINK_MIN_VERSION) e tratat ca think pornit:
+    fără stop / num_predict pe server, doar plafonul client-side.
+    Un răspuns tăiat (done_reason="length", plafon atins, <think> neînchis, JSON
+    neparsabil) nu intră în cache.
     """
     if enabled("AGENT_LOG_PROMPT"):
         section(f"{label} PROMPT ({model})")
         block("prompt", trunc(prompt, 2500))
 
-    url = f"{settings.OLLAMA_BASE_URL}/api/generate"
     timeout = (settings.OLLAMA_TIMEOUT_CONNECT, settings.OLLAMA_TIMEOUT_READ)
     wants_stream = stream_cb is not None
+    ctl = call_options(label)
+    stop_when = EARLY_STOP.get(ctl.get("early_stop"))
+    if ctl.get("early_stop") == "json" and json_stream is not None:
+        stop_when = lambda parts, chunk: json_stream.done
+    think_off = ctl.get("think") is False
+    answer_cap = ctl.get("num_predict") if not think_off else None
+    # early stop / plafonul client-side au nevoie de stream, chiar dacă apelantul vrea doar textul final
+    stream = wants_stream or stop_when is not None or ctl.get("num_predict") is not None
+
+    def feed(text: str):
+        if json_stream is None:
+            return
+        for k, v in json_stream.feed(text):
+            if wants_stream:
+                stream_cb(label, "field", {"key": k, "value": v})
 
     if wants_stream:
         stream_cb(label, "prompt", {"model": model, "prompt": trunc(prompt, 4000)})
 
-    last_err = None
+    options = dict(GENERATE_OPTIONS)
+    options.update({k: ctl[k] for k in ("num_predict", "stop") if ctl.get(k) is not None})
+    if not think_off:
+        options.pop("num_predict", None)  # plafonul se aplică după </think>, nu pe tot output-ul
+    extra = {"think": ctl["think"]} if "think" in ctl else {}
+    llm_cache = get_llm_cache() if cache and cacheable(options) else None
+    key = cache_key(model, prompt, {**options, **extra}) if llm_cache is not None else None
+    def complete(out: str, truncated: bool) -> bool:
+        # doar răspunsurile întregi și utilizabile se păstrează în cache
+        if truncated or not out or _after_think(out) is None:
+            return False
+        return json_stream is None or json_stream.value is not None
+
+    if llm_cache is not None:
+        out = llm_cache.get(key)
+        if out is not None:
+            if enabled("AGENT_LOG_RAW"):
+                section(f"{label} RAW OUTPUT ({model}, cached)")
+                block("raw", trunc(out, 2500))
+            for i in range(0, len(out), CACHE_REPLAY_CHUNK):
+                if wants_stream:
+                    stream_cb(label, "chunk", {"text": out[i:i + CACHE_REPLAY_CHUNK]})
+                feed(out[i:i + CACHE_REPLAY_CHUNK])
+            if wants_stream:
+                stream_cb(label, "done", {"len": len(out), "cached": True})
+            return out
+
+    client = get_ollama_client()
+    pool = client.pool
+    failed: set[str] = set()
     for attempt in range(settings.OLLAMA_RETRIES + 1):
         try:
-            with requests.post(
-                url,
-                json={
+            ep = pool.acquire(model, exclude=failed)
+        except RuntimeError:
+            if not failed:
+                raise
+            failed.clear()  # toate au căzut în acest apel: reîncercăm oricare
+            ep = pool.acquire(model)
+        lim = get_limiter().acquire(ep.url)
+        ok = down = False
+        send_options, attempt_cap = options, answer_cap
+        if think_off and not ep.supports_think:
+            # serverul ignoră think=False: modelul începe cu <think>, iar "\n" / un plafon mic l-ar tăia acolo
+            send_options = {k: v for k, v in options.items() if k not in ("stop", "num_predict")}
+            attempt_cap = ctl.get("num_predict")
+        if json_stream is not None:
+            json_stream.reset()
+        try:
+            with client.post_generate(
+                ep,
+                {
                     "model": model,
                     "prompt": prompt,
-                    "stream": wants_stream,
+                    "stream": stream,
                     #"raw": True,
-                    "options": {"temperature": 0, "top_p": 0.9},
+                    "options": send_options,
+                    **extra,
                 },
-                stream=wants_stream,
+                stream=stream,
                 timeout=timeout,
             ) as r:
+                if lim is not None:
+                    lim.report(status=r.status_code)
                 if r.status_code != 200:
                     err_text = r.text[:2000] if r.text else ""
                     raise RuntimeError(f"Ollama HTTP {r.status_code}: {err_text}")
 
-                if not wants_stream:
-                    out = r.json().get("response", "")
+                if not stream:
+                    final = r.json()
+                    client.record(model, final)
+                    out = final.get("response", "")
+                    feed(out)
                     if enabled("AGENT_LOG_RAW"):
                         section(f"{label} RAW OUTPUT ({model})")
                         block("raw", trunc(out, 2500))
+                    if llm_cache is not None and complete(out, final.get("done_reason") == "length"):
+                        llm_cache.put(key, model, out)
+                    ok = True
                     return out
 
                 full = []
+                finished = truncated = False
+                cap = AnswerCap(attempt_cap) if attempt_cap is not None else None
                 for line in r.iter_lines(decode_unicode=True):
                     if not line:
                         continue
@@ -102,22 +223,67 @@ def ollama_generate(model: str, prompt: str, label: str = "OLLAMA", stream_cb=No
                     chunk = obj.get("response", "")
                     if chunk:
                         full.append(chunk)
-                        stream_cb(label, "chunk", {"text": chunk})
+                        if wants_stream:
+                            stream_cb(label, "chunk", {"text": chunk})
+                        feed(chunk)
                     if obj.get("done"):
+                        client.record(model, obj)
+                        finished = True
+                        truncated = obj.get("done_reason") == "length"
+                        break
+                    if stop_when is not None and chunk and stop_when(full, chunk):
+                        # răspunsul e complet: închidem conexiunea, Ollama nu mai generează
+                        client.record_early_stop(model)
+                        finished = True
+                        break
+                    if cap is not None and chunk and cap.feed(chunk):
+                        # plafonul răspunsului (după </think>) depășit: tăiat, nu intră în cache
+                        client.record_early_stop(model)
+                        finished = truncated = True
                         break
 
                 out = "".join(full)
-                stream_cb(label, "done", {"len": len(out)})
+                if enabled("AGENT_LOG_RAW"):
+                    section(f"{label} RAW OUTPUT ({model})")
+                    block("raw", trunc(out, 2500))
+                if llm_cache is not None and finished and complete(out, truncated):
+                    llm_cache.put(key, model, out)
+                if wants_stream:
+                    stream_cb(label, "done", {"len": len(out)})
+                ok = True
                 return out
 
         except Exception as e:
-            last_err = e
+            if lim is not None and isinstance(e, requests.RequestException):
+                lim.report(error=True)
+            if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                down = True
+                failed.add(ep.url)
             if wants_stream:
                 stream_cb(label, "error", {"error": str(e)})
             if attempt < settings.OLLAMA_RETRIES:
                 time.sleep(0.6 * (attempt + 1))
                 continue
             raise
+        finally:
+            pool.release(ep, model, ok=ok, down=down)
+
+
+def generate_json(model: str, prompt: str, label: str, stream_cb, fallback: dict) -> dict:
+    """Apel LLM care așteaptă un obiect JSON: parsat din stream, altfel fallback."""
+    js = JsonStream()
+    ollama_generate(model, prompt, label=label, stream_cb=stream_cb, json_stream=js)
+    return js.value if js.value is not None else fallback
+
+
+INTENTS = {"OFFER_SERVICE", "SELL_ITEM", "RENTAL", "WANTED", "IRRELEVANT"}
+
+
+def normalize_intent(raw) -> str:
+    out = str(raw or "").strip().upper()
+    out = out.split()[0] if out else "IRRELEVANT"
+    return out if out in INTENTS else "IRRELEVANT"
+
 
 def classify_intent(model: str, title: str, description: str, stream_cb=None):
     """
@@ -142,15 +308,11 @@ TITLE: {title}
 DESCRIPTION: {description}
 """.strip()
 
-    try:
-        out = (ollama_generate(model, prompt, label="INTENT", stream_cb=stream_cb) or "").strip().upper()
-    except Exception:
-        return "IRRELEVANT"
-
-    out = out.split()[0] if out else "IRRELEVANT"
-    if out not in {"OFFER_SERVICE","SELL_ITEM","RENTAL","WANTED","IRRELEVANT"}:
-        return "IRRELEVANT"
-    return out
+    # o eroare Ollama se propagă: un apel eșuat nu devine eticheta IRRELEVANT
+    out = _after_think(ollama_generate(model, prompt, label="INTENT", stream_cb=stream_cb) or "")
+    if out is None or not out.strip():
+        raise RuntimeError("intent: răspuns fără etichetă (tăiat în <think>)")
+    return normalize_intent(out.strip().upper())
 
 def analyze_cabin_minimal(model: str, title: str, description: str, price_ron: int | None, stream_cb=None):
     prompt = f"""
@@ -174,8 +336,7 @@ PRICE_RON: {price_ron}
 DESCRIPTION: {description}
 """.strip()
 
-    resp = ollama_generate(model, prompt, label="CABIN_MIN", stream_cb=stream_cb)
-    return safe_json(resp, {
+    return generate_json(model, prompt, "CABIN_MIN", stream_cb, {
         "score": 5.0,
         "verdict": "NECLAR",
         "price_hint": "fallback",
@@ -206,8 +367,7 @@ MINIMAL:
 {json.dumps(minimal, ensure_ascii=False)}
 """.strip()
 
-    resp = ollama_generate(model, prompt, label="CABIN_VERBOSE", stream_cb=stream_cb)
-    return safe_json(resp, {
+    return generate_json(model, prompt, "CABIN_VERBOSE", stream_cb, {
         "confidence": 0.4,
         "must_ask_seller": ["Care e prețul pe noapte și pentru ce perioadă?"],
         "dealbreakers_found": [],
@@ -219,10 +379,7 @@ MINIMAL:
 
 def analyze_minimal(model: str, title: str, description: str, price_ron: int | None, stream_cb=None):
     prompt = f"""
-    Răspunde în DOUĂ părți, în ordinea exactă:
-
-    1) <think> ... </think>  (gândirea ta, liber)
-    2) JSON STRICT (fără text extra după JSON)
+    {answer_format("MINIMAL")}
 
     JSON schema:
     {{
@@ -248,8 +405,7 @@ def analyze_minimal(model: str, title: str, description: str, price_ron: int | N
     DESCRIPTION: {description}
     """.strip()
 
-    resp = ollama_generate(model, prompt, label="MINIMAL", stream_cb=stream_cb)
-    return safe_json(resp, {
+    return generate_json(model, prompt, "MINIMAL", stream_cb, {
         "score": 5.0,
         "verdict": "NECLAR",
         "likely_fix": "unknown",
@@ -296,8 +452,7 @@ Analiză minimală deja făcută:
 {json.dumps(minimal, ensure_ascii=False)}
 """.strip()
 
-    resp = ollama_generate(judge_model, prompt, label="VERBOSE", stream_cb=stream_cb)
-    return safe_json(resp, {
+    return generate_json(judge_model, prompt, "VERBOSE", stream_cb, {
         "confidence": 0.4,
         "signals_positive": [],
         "signals_negative": ["Fallback: output neparsabil."],
@@ -310,6 +465,112 @@ Analiză minimală deja făcută:
         "notes": "Fallback: output neparsabil."
     })
 
+def analyze_intent_minimal(model: str, title: str, description: str, price_ron: int | None,
+                           domain: str = "generic", stream_cb=None) -> tuple[str, dict]:
+    """
+    Mod combinat: un singur apel întoarce și intent-ul, și JSON-ul minimal
+    (în locul classify_intent + analyze_minimal / analyze_cabin_minimal).
+    Titlul și descrierea se trimit o singură dată. Întoarce (intent, minimal).
+    """
+    intent_rules = """
+intent: STRICT unul din OFFER_SERVICE | SELL_ITEM | RENTAL | WANTED | IRRELEVANT
+- OFFER_SERVICE: repar/service/la domiciliu/firmă/atelier/intervenții/instalări
+- RENTAL: închiriez/de închiriat/noapte/cazare/booking/airbnb/chalet/cabană/pensiune (ca ofertă)
+- SELL_ITEM: vând/vanzare/preț fix/negociabil/defect/stricat (ca produs)
+- WANTED: cumpăr/caut să cumpăr/achiziționez/caut
+- IRRELEVANT: altceva
+""".strip()
+
+    if domain == "rentals_cabins":
+        prompt = f"""
+Returnează STRICT JSON (fără text extra). Limba: română.
+Chei:
+intent (vezi mai jos),
+score (0..10),
+verdict (MERITĂ/NECLAR/NU MERITĂ),
+price_hint (text scurt, ex: "450 lei/noapte" sau "preț lipsă"),
+signals_positive (listă scurtă),
+signals_negative (listă scurtă),
+scam_risk (0..10),
+reasoning_short (max 2 fraze).
+
+{intent_rules}
+
+Reguli:
+- Penalizează: "avans integral", "whatsapp", "fără contract", "fără acte", "doar azi", "urgent", "plătește acum", "link", "telegram".
+- Bonus: locație clară, poze multe, facilități detaliate, capacitate clară, disponibilitate/perioadă, reguli clare.
+- Dacă pare vânzare (de vanzare/vând/teren) => verdict=NU MERITĂ.
+
+TITLE: {title}
+PRICE_RON: {price_ron}
+DESCRIPTION: {description}
+""".strip()
+        fallback = {
+            "score": 5.0,
+            "verdict": "NECLAR",
+            "price_hint": "fallback",
+            "signals_positive": [],
+            "signals_negative": [],
+            "scam_risk": 5.0,
+            "reasoning_short": "Fallback: output neparsabil."
+        }
+        label = "CABIN_INTENT_MIN"
+    else:
+        prompt = f"""
+{answer_format("INTENT_MIN")}
+
+JSON schema:
+{{
+  "intent": "OFFER_SERVICE" | "SELL_ITEM" | "RENTAL" | "WANTED" | "IRRELEVANT",
+  "score": 0..10,
+  "verdict": "MERITĂ" | "MERITĂ LA PIESE" | "NU MERITĂ",
+  "likely_fix": "lvds"|"tcon"|"psu"|"mainboard"|"panel"|"unknown",
+  "repair_estimate_low": int,
+  "repair_estimate_high": int,
+  "parts_suspected": "text scurt",
+  "reasoning_short": "max 2 fraze"
+}}
+
+{intent_rules}
+
+Reguli cost: LVDS 0-50, TCON 80-150, PSU 100-200, MAINBOARD 250-450, PANEL 9999.
+Dacă indicii de panel (dungi/pete/crăpat/jumătate ecran) => likely_fix=panel, verdict=NU MERITĂ.
+Regulă STRICTĂ:
+- Dacă descrierea spune "funcționează / fără defect" și NU există simptome tehnice descrise,
+  atunci likely_fix="unknown" și parts_suspected="necunoscut".
+- Nu menționa LVDS/TCON/PSU/Mainboard decât dacă există simptome specifice.
+
+TITLE: {title}
+PRICE_RON: {price_ron}
+DESCRIPTION: {description}
+""".strip()
+        fallback = {
+            "score": 5.0,
+            "verdict": "NECLAR",
+            "likely_fix": "unknown",
+            "repair_estimate_low": 150,
+            "repair_estimate_high": 450,
+            "parts_suspected": "mainboard/tcon",
+            "reasoning_short": "Fallback: output neparsabil."
+        }
+        label = "INTENT_MIN"
+
+    # o eroare Ollama se propagă (ca la analyze_minimal): anunțul ajunge 'error', nu 'saved'
+    minimal = generate_json(model, prompt, label, stream_cb, fallback)
+    intent = normalize_intent(minimal.pop("intent", None))
+    return intent, minimal
+
+def judge_verbose(judge_model: str, title: str, description: str, price_ron: int | None,
+                  minimal: dict, domain: str = "generic", stream_cb=None) -> dict | None:
+    """Analiza verbose (judge); la eroare întoarce None și pune judge_error în minimal."""
+    try:
+        if domain == "rentals_cabins":
+            return analyze_cabin_verbose(judge_model, title, description, price_ron, minimal, stream_cb=stream_cb)
+        return analyze_verbose(judge_model, title, description, price_ron, minimal, stream_cb=stream_cb)
+    except Exception as e:
+        minimal["judge_error"] = str(e)[:500]
+        return None
+
 def analyze_ad(
     model: str,
     judge_model: str | None,
@@ -320,8 +581,12 @@ def analyze_ad(
     keyword_bonus: float = 0.0,
     domain: str = "generic",
     stream_cb=None,
+    minimal: dict | None = None,
 ):
-    if domain == "rentals_cabins":
+    # minimal deja calculat (mod combinat intent+minimal) => fără al doilea apel
+    if minimal is not None:
+        pass
+    elif domain == "rentals_cabins":
         minimal = analyze_cabin_minimal(model, title, description, price_ron, stream_cb=stream_cb)
     else:
         minimal = analyze_minimal(model, title, description, price_ron, stream_cb=stream_cb)
@@ -347,13 +612,6 @@ def analyze_ad(
     out = {"minimal": minimal, "verbose": None}
 
     if judge_model and minimal_score >= verbose_threshold:
-        try:
-            if domain == "rentals_cabins":
-                out["verbose"] = analyze_cabin_verbose(judge_model, title, description, price_ron, minimal, stream_cb=stream_cb)
-            else:
-                out["verbose"] = analyze_verbose(judge_model, title, description, price_ron, minimal, stream_cb=stream_cb)
-        except Exception as e:
-            out["verbose"] = None
-            minimal["judge_error"] = str(e)[:500]
+        out["verbose"] = judge_verbose(judge_model, title, description, price_ron, minimal, domain, stream_cb)
 
     return out
@@ -16,11 +16,20 @@ import time
 import json
 from events import create_run, get_queue, close_run
 
-from scrape import scrape
+from browser import get_browser, browser_metrics
+from ratelimit import rate_limit_metrics
+from llm_cache import llm_cache_metrics
+from intent_local import intent_metrics
+from ollama_pool import ollama_pool_metrics
+from ollama_client import ollama_client_metrics
+from watch import start_watch, stop_watch, list_watches
+from runs import new_run, execute_run, cancel_run, is_active
+from db import list_runs, get_run, mark_interrupted_runs
 
 app = Flask(__name__)
 app.secret_key = settings.SECRET_KEY
 init_db()
+mark_interrupted_runs()
 # ---- ADS ----
 
 @app.get("/")
@@ -156,7 +165,7 @@ pre{white-space:pre-wrap;margin:0}
 <body>
 <h2>Live Run <span class="muted">({{ run_id }})</span></h2>
 <div class="wrap">
-  <div class="col" id="log"><div class="title">Log</div></div>
+  <div class="col" id="log"><div class="title">Log</div><div class="muted" id="pipe"></div></div>
   <div class="col" id="llm">
     <div class="title">LLM stream</div>
     <div class="muted">INTENT / MINIMAL / VERBOSE curg token cu token.</div>
@@ -166,6 +175,7 @@ pre{white-space:pre-wrap;margin:0}
 <script>
 const logEl = document.getElementById("log");
 const llmOut = document.getElementById("llm_out");
+const pipeEl = document.getElementById("pipe");
 
 function addLog(html){
   const d = document.createElement("div");
@@ -187,6 +197,11 @@ function ensureLLMBox(label){
   chip.textContent = label;
   box.appendChild(chip);
 
+  // câmpurile JSON (score, verdict...) apar aici cum sosesc, înainte de finalul output-ului
+  const fieldsEl = document.createElement("div");
+  fieldsEl.className = "kv";
+  box.appendChild(fieldsEl);
+
   const thinkTitle = document.createElement("div");
   thinkTitle.className = "muted";
   thinkTitle.style.margin = "6px 0 4px";
@@ -211,6 +226,7 @@ function ensureLLMBox(label){
     inThink: false,
     thinkEl: thinkPre,
     outEl: outPre,
+    fieldsEl: fieldsEl,
     lastActivityTs: Date.now(),
     typing: false
   };
@@ -245,6 +261,14 @@ es.onmessage = function(ev){
     addLog('<div class="kv">' + (d.key || "") + ': <span class="muted">' + String(d.value) + '</span></div>');
     return;
   }
+  if (t === "pipeline") {
+    // adâncimea cozilor pe stage: fetch 3/8 → parse 0/8 → llm 2/8 → db 0/8
+    const parts = (d.stages || []).map(function(s){
+      return s.stage + " " + s.depth + "/" + s.maxsize + (s.busy ? " (" + s.busy + " busy)" : "");
+    });
+    pipeEl.textContent = parts.join(" → ");
+    return;
+  }
   if (t === "block") {
     addLog('<div class="kv"><b>' + (d.label || "") + '</b><pre>' + (d.content || "") + '</pre></div>');
     return;
@@ -260,6 +284,7 @@ es.onmessage = function(ev){
       st.typing = true;
       st.thinkEl.textContent = "";
       st.outEl.textContent = "";
+      st.fieldsEl.textContent = "";
       st.outEl.textContent += "[PROMPT]\\n" + (d.prompt || "") + "\\n\\n[OUTPUT]\\n";
       llmOut.scrollTop = llmOut.scrollHeight;
       return;
@@ -289,8 +314,17 @@ es.onmessage = function(ev){
       return;
     }
 
+    if (d.kind === "field") {
+      const v = (typeof d.value === "object") ? JSON.stringify(d.value) : String(d.value);
+      if (v.length <= 120) {
+        st.fieldsEl.textContent += (st.fieldsEl.textContent ? " · " : "") + d.key + "=" + v;
+      }
+      return;
+    }
+
     if (d.kind === "done") {
       st.typing = false;
+      if (d.cached && st.outEl) st.outEl.textContent += "\\n[cache]";
       llmOut.scrollTop = llmOut.scrollHeight;
       return;
     }
@@ -321,6 +355,12 @@ es.onerror = function(){
 
 </body></html>"""
 
+@app.get("/metrics")
+def metrics():
+    return {"browser": browser_metrics(), "rate_limits": rate_limit_metrics(), "llm_cache": llm_cache_metrics(),
+            "intent": intent_metrics(), "ollama": ollama_pool_metrics(),
+            "llm": ollama_client_metrics(), "watches": list_watches()}
+
 @app.get("/run/live/<run_id>")
 def run_live(run_id):
     return render_template_string(LIVE_HTML, run_id=run_id)
@@ -336,6 +376,8 @@ def run_page():
         model = (request.form.get("model") or settings.DEFAULT_MODEL).strip()
         pages = int(request.form.get("pages") or 2)
         max_ads = int(request.form.get("max_ads") or 10)
+        fetch_mode = request.form.get("fetch_mode") or settings.FETCH_MODE
+        snapshots = bool(request.form.get("snapshots"))
 
         prof = get_profile(profile_id)
         if not prof:
@@ -343,17 +385,57 @@ def run_page():
 
         run_id = create_run()
 
-        def worker():
-            try:
-                for q in prof["queries"]:
-                    scrape(query=q, model=model, profile_id=profile_id, max_pages=pages, max_ads=max_ads, run_id=run_id)
-            finally:
-                close_run(run_id)
+        if request.form.get("watch"):
+            interval = float(request.form.get("interval") or settings.WATCH_INTERVAL_MIN)
+            start_watch(profile_id, model, interval_min=interval, max_pages=pages, max_ads=max_ads,
+                        fetch_mode=fetch_mode, run_id=run_id)
+            return redirect(url_for("run_live", run_id=run_id))
 
-        threading.Thread(target=worker, daemon=True).start()
+        # run checkpointat în SQLite: poate fi reluat din /runs după crash / restart
+        new_run(profile_id, model, prof["queries"], pages=pages, max_ads=max_ads, fetch_mode=fetch_mode, run_id=run_id,
+                snapshots=snapshots)
+        _start_run_thread(run_id)
         return redirect(url_for("run_live", run_id=run_id))
 
-    return render_template("run.html", profiles=profiles, default_model=settings.DEFAULT_MODEL)
+    return render_template("run.html", profiles=profiles, default_model=settings.DEFAULT_MODEL,
+                           fetch_mode=settings.FETCH_MODE, snapshots=settings.SNAPSHOTS_ENABLED,
+                           watch_interval=settings.WATCH_INTERVAL_MIN,
+                           watches=list_watches())
+
+def _start_run_thread(run_id: str):
+    def worker():
+        try:
+            execute_run(run_id)
+        finally:
+            close_run(run_id)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+@app.get("/runs")
+def runs_page():
+    runs = list_runs()
+    for r in runs:
+        r["active"] = is_active(r["id"])
+    return render_template("runs.html", runs=runs)
+
+@app.post("/runs/<run_id>/resume")
+def run_resume(run_id):
+    if not get_run(run_id):
+        abort(404)
+    if not is_active(run_id):
+        create_run(run_id)
+        _start_run_thread(run_id)
+    return redirect(url_for("run_live", run_id=run_id))
+
+@app.post("/runs/<run_id>/cancel")
+def run_cancel(run_id):
+    cancel_run(run_id)
+    return redirect(url_for("runs_page"))
+
+@app.get("/watch/<int:profile_id>/stop")
+def watch_stop(profile_id):
+    stop_watch(profile_id)
+    return redirect(url_for("run_page"))
 
 @app.route("/profiles/wizard", methods=["GET", "POST"])
 def profile_wizard_start():
@@ -394,4 +476,6 @@ def profile_wizard_answer():
     return render_template("wizard_answers.html", goal=goal, model=model, questions=questions)
 
 if __name__ == "__main__":
+    # pornim Chromium din timp, ca primul run să nu plătească lansarea
+    threading.Thread(target=lambda: get_browser().start(), daemon=True).start()
     app.run(debug=True, port=5005, use_reloader=False, threaded=True)
@@ -0,0 +1,537 @@
+# browser.py
+import os
+import time
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque, Counter
+from typing import Iterator
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+from config import settings
+from ratelimit import get_limiter, parse_retry_after
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _process_tree_rss_mb(root_pid: int) -> float | None:
+    """RSS total (MB) pentru procesele copil (driver Playwright + Chromium)."""
+    if psutil is not None:
+        try:
+            kids = psutil.Process(root_pid).children(recursive=True)
+            return sum(k.memory_info().rss for k in kids) / (1024 * 1024)
+        except Exception:
+            return None
+
+    if not os.path.isdir("/proc"):
+        return None
+    parents: dict[int, int] = {}
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/stat") as f:
+                # pid (comm) state ppid ... ; comm poate conține spații
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            parents[int(d)] = ppid
+        except Exception:
+            continue
+
+    tree, frontier = set(), {root_pid}
+    while frontier:
+        frontier = {p for p, pp in parents.items() if pp in frontier and p not in tree}
+        tree |= frontier
+
+    total_kb = 0
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except Exception:
+            continue
+    return total_kb / 1024
+
+
+async def _agoto(page, url: str, timeout_ms: int | None = None):
+    """page.goto sub rate limiter-ul host-ului; status-ul / timeout-ul ajustează rata."""
+    lim = await get_limiter().aacquire(url)
+    t0 = time.monotonic()
+    kwargs = {"wait_until": "domcontentloaded"}
+    if timeout_ms is not None:
+        kwargs["timeout"] = timeout_ms
+    try:
+        resp = await page.goto(url, **kwargs)
+    except Exception:
+        if lim is not None:
+            lim.report(error=True)
+        raise
+    if lim is not None:
+        status = resp.status if resp is not None else None
+        retry_after = parse_retry_after(resp.headers.get("retry-after")) if resp is not None else None
+        lim.report(status=status, elapsed=time.monotonic() - t0, retry_after=retry_after)
+    return resp
+
+
+# href-ul primului card din lista de rezultate (se schimbă când s-a încărcat pagina următoare)
+_FIRST_CARD_JS = """() => {
+    const a = document.querySelector("[data-cy='l-card'] a[href], [data-testid='l-card'] a[href]");
+    return a ? a.href : null;
+}"""
+
+
+# pus în coada de pagini a contextului vechi la recovery: trezește coroutinele care
+# așteaptă o pagină acolo (fiecare îl pune la loc pentru următoarea)
+_STALE_POOL = object()
+
+
+def _main_frame_navigation(req) -> bool:
+    # iframe-urile (ad-tech) navighează și ele; doar documentul paginii contează
+    if not req.is_navigation_request():
+        return False
+    try:
+        return req.frame.parent_frame is None
+    except Exception:
+        return False  # request de service worker: fără frame
+
+
+def request_allowed(resource_type: str, url: str, navigation: bool = False) -> bool:
+    """
+    Politica de blocare: extractoarele au nevoie doar de HTML-ul OLX (+ JSON-ul
+    inline). Tot ce e third-party (ad-tech, analytics) și tipurile grele
+    (imagini, fonturi, media, CSS) se opresc înainte să plece din browser.
+    Navigările (documentul principal) trec mereu: rezultatele OLX conțin și
+    anunțuri găzduite pe alte domenii (ex. storia.ro).
+    """
+    if navigation:
+        return True
+    host = (urlparse(url).hostname or "").lower()
+    first_party = any(host == h or host.endswith("." + h) for h in settings.FIRST_PARTY_HOSTS)
+    if not first_party:
+        return False
+    return resource_type in settings.ALLOWED_RESOURCE_TYPES
+
+
+class BrowserService:
+    """
+    Un singur Chromium "cald" per proces, folosit de worker-ul Flask și de CLI.
+
+    Playwright (API async) rulează într-un thread dedicat cu event loop propriu;
+    fiecare scrape() primește un BrowserSession = context nou pe browserul deja
+    pornit (context-urile sunt ieftine, lansarea Chromium nu).
+    Browserul e repornit dacă a crăpat sau dacă RSS-ul trece de BROWSER_MAX_RSS_MB.
+    """
+
+    def __init__(self, headless: bool | None = None):
+        self.headless = settings.BROWSER_HEADLESS if headless is None else headless
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+        # obiecte Playwright: folosite DOAR din thread-ul loop-ului
+        self._pw = None
+        self._browser = None
+
+        self._active = 0
+        self._restart_pending = False
+        self._launches = 0
+        self._restarts = 0
+        self._last_launch_s: float | None = None
+        self._total_launch_s = 0.0
+        self._net = Counter()
+
+    # ---- lifecycle ----
+
+    def start(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="browser-loop", daemon=True)
+                self._thread.start()
+        self._call(self._aensure())
+        return self
+
+    def shutdown(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._astop(), loop).result(30)
+        except Exception:
+            pass
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=10)
+            loop.close()
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, coro, timeout: float | None = None):
+        # niciodată fără limită: un apel blocat nu trebuie să țină un worker pentru totdeauna
+        fut = self._submit(coro)
+        try:
+            return fut.result(timeout or settings.BROWSER_CALL_TIMEOUT_S)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            raise
+
+    @property
+    def connected(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _alaunch(self):
+        t0 = time.perf_counter()
+        if self._pw is None:
+            self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch(headless=self.headless)
+        dt = time.perf_counter() - t0
+        self._launches += 1
+        self._last_launch_s = dt
+        self._total_launch_s += dt
+
+    async def _aclose_browser(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+
+    async def _aensure(self):
+        if not self.connected:
+            if self._browser is not None:
+                self._restarts += 1  # a crăpat / s-a deconectat
+            await self._aclose_browser()
+            await self._alaunch()
+
+    async def _arestart(self):
+        self._restarts += 1
+        await self._aclose_browser()
+        await self._alaunch()
+
+    async def _astop(self):
+        await self._aclose_browser()
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+    # ---- sesiuni ----
+
+    def session(self, concurrency: int | None = None, user_agent: str | None = None) -> "BrowserSession":
+        self.start()
+        with self._lock:
+            restart = self._restart_pending and self._active == 0
+            if restart:
+                self._restart_pending = False
+            self._active += 1
+        try:
+            if restart:
+                self._call(self._arestart())
+            return BrowserSession(self, concurrency=concurrency, user_agent=user_agent)
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self, net: Counter | None = None):
+        with self._lock:
+            self._active -= 1
+            if net:
+                self._net.update(net)
+            idle = self._active == 0
+        rss = self.rss_mb()
+        if rss is not None and rss > settings.BROWSER_MAX_RSS_MB:
+            if idle:
+                self._call(self._arestart())
+            else:
+                with self._lock:
+                    self._restart_pending = True
+
+    # ---- metrics ----
+
+    def rss_mb(self) -> float | None:
+        if not self.connected:
+            return None
+        return _process_tree_rss_mb(os.getpid())
+
+    def metrics(self) -> dict:
+        rss = self.rss_mb()
+        return {
+            "connected": self.connected,
+            "launches": self._launches,
+            "restarts": self._restarts,
+            "last_launch_s": round(self._last_launch_s, 3) if self._last_launch_s is not None else None,
+            "total_launch_s": round(self._total_launch_s, 3),
+            "active_sessions": self._active,
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "net": dict(self._net),
+        }
+
+
+class BrowserSession:
+    """
+    Un BrowserContext pe browserul partajat, pentru un singur scrape().
+
+    API-ul public e sincron și thread-safe: fetch() poate fi apelat din mai multe
+    thread-uri, iar paginile de anunț se încarcă în paralel printr-un pool de
+    maxim `concurrency` pagini refolosibile.
+    """
+
+    def __init__(self, service: BrowserService, concurrency: int | None = None, user_agent: str | None = None):
+        self.service = service
+        self.concurrency = max(1, int(concurrency or settings.AD_FETCH_CONCURRENCY))
+        self.user_agent = user_agent or settings.USER_AGENT
+
+        self._browser_ref = None
+        self._context = None
+        self._search_page = None
+        self._pages: asyncio.Queue | None = None
+        self._pages_created = 0
+        self._generation = 0
+        self._recover_lock: asyncio.Lock | None = None
+        self._closed = False
+        self.net = Counter()  # requests/bytes permise vs blocate, pe sesiune (= run)
+
+        self.service._call(self._aopen())
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.service._call(self._aclose(), timeout=30)
+        finally:
+            self.service._release(self.net)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def _aopen(self):
+        await self.service._aensure()
+        self._browser_ref = self.service._browser
+        self._context = await self._browser_ref.new_context(user_agent=self.user_agent)
+        if settings.BLOCK_RESOURCES:
+            await self._context.route("**/*", self._aroute)
+        self._context.on("requestfinished", self._aon_request_finished)
+        if self._pages is not None:
+            self._pages.put_nowait(_STALE_POOL)
+        self._pages = asyncio.Queue()
+        self._pages_created = 0
+        self._search_page = None
+        self._generation += 1
+        if self._recover_lock is None:
+            self._recover_lock = asyncio.Lock()
+
+    async def _aclose(self):
+        if self._context is not None:
+            try:
+                await self._context.close()
+            except Exception:
+                pass
+            self._context = None
+
+    @property
+    def _stale(self) -> bool:
+        # contextul aparține unui Chromium care a crăpat / a fost repornit
+        return self._browser_ref is not self.service._browser or not self.service.connected
+
+    async def _arecover(self, generation: int):
+        # Chromium a crăpat: îl repornim (o singură dată) și refacem contextul
+        async with self._recover_lock:
+            if generation != self._generation:
+                return
+            await self._aclose()
+            await self._aopen()
+
+    # ---- network filtering ----
+
+    async def _aroute(self, route):
+        req = route.request
+        if request_allowed(req.resource_type, req.url, _main_frame_navigation(req)):
+            self.net["allowed"] += 1
+            await route.continue_()
+        else:
+            self.net["blocked"] += 1
+            self.net[f"blocked:{req.resource_type}"] += 1
+            await route.abort()
+
+    async def _aon_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.net["allowed_bytes"] += max(0, sizes.get("responseBodySize", 0)) + max(0, sizes.get("responseHeadersSize", 0))
+
+    def net_stats(self) -> dict:
+        return dict(self.net)
+
+    # ---- ad pages (pool) ----
+
+    async def _acquire_page(self):
+        """(pagină, generația contextului din care vine)."""
+        while True:
+            generation, pages = self._generation, self._pages
+            if pages.empty() and self._pages_created < self.concurrency:
+                self._pages_created += 1
+                try:
+                    return await self._context.new_page(), generation
+                except Exception:
+                    self._pages_created -= 1
+                    raise
+            page = await pages.get()
+            if page is not _STALE_POOL:
+                return page, generation
+            # contextul a fost refăcut cât așteptam: trezim următorul și trecem pe pool-ul nou
+            pages.put_nowait(_STALE_POOL)
+
+    async def _release_page(self, page, generation: int, broken: bool = False):
+        if generation != self._generation:
+            return  # pagină din contextul vechi (dinainte de restart)
+        if broken:
+            # o pagină care a dat eroare poate rămâne într-o stare ciudată => o înlocuim
+            self._pages_created -= 1
+            try:
+                await page.close()
+            except Exception:
+                pass
+            return
+        self._pages.put_nowait(page)
+
+    async def _afetch_once(self, url: str, timeout_ms: int):
+        page, generation = await self._acquire_page()
+        try:
+            await _agoto(page, url, timeout_ms)
+            html = await page.content()
+        except BaseException:
+            await self._release_page(page, generation, broken=True)
+            if self._stale:
+                await self._arecover(generation)
+            raise
+        await self._release_page(page, generation)
+        return html
+
+    async def _afetch(self, url: str, timeout_ms: int):
+        generation = self._generation
+        try:
+            return await self._afetch_once(url, timeout_ms)
+        except Exception:
+            if generation == self._generation:
+                raise
+            # contextul a fost refăcut după un crash Chromium => o singură reîncercare
+            return await self._afetch_once(url, timeout_ms)
+
+    def fetch(self, url: str, timeout_ms: int = 30000) -> str:
+        return self.service._call(self._afetch(url, timeout_ms))
+
+    def fetch_many(self, urls: list[str], timeout_ms: int = 30000,
+                   concurrency: int | None = None) -> Iterator[tuple[str, str | None, Exception | None]]:
+        """
+        Generator: (url, html, err) în ordinea din `urls`, cu maxim `concurrency`
+        încărcări în zbor. Dacă consumatorul se oprește (break), restul se anulează.
+        """
+        window = max(1, min(concurrency or self.concurrency, self.concurrency))
+        todo = deque(urls)
+        inflight = deque()
+
+        def fill():
+            while todo and len(inflight) < window:
+                u = todo.popleft()
+                inflight.append((u, self.service._submit(self._afetch(u, timeout_ms))))
+
+        try:
+            fill()
+            while inflight:
+                url, fut = inflight.popleft()
+                try:
+                    html, err = fut.result(settings.BROWSER_CALL_TIMEOUT_S), None
+                except concurrent.futures.TimeoutError as e:
+                    fut.cancel()
+                    html, err = None, e
+                except Exception as e:
+                    html, err = None, e
+                fill()
+                yield url, html, err
+        finally:
+            for _, fut in inflight:
+                fut.cancel()
+
+    # ---- search page (click-based pagination) ----
+
+    async def _aopen_search(self, url: str):
+        if self._search_page is None:
+            self._search_page = await self._context.new_page()
+        await _agoto(self._search_page, url)
+
+    async def _asearch_html(self):
+        return await self._search_page.content()
+
+    async def _anext_search_page(self, timeout_ms: int = 30000):
+        """
+        Click pe "next". Paginarea OLX e o navigare client-side (Next.js), deci
+        așteptăm ca URL-ul și primul card din listă să se schimbe; altfel
+        search_html() ar citi tot pagina veche. False dacă nu mai există pagină.
+        """
+        page = self._search_page
+        next_btn = await page.query_selector("a[rel='next']")
+        if not next_btn:
+            return False
+        old_url = page.url
+        old_first = await page.evaluate(_FIRST_CARD_JS)
+        lim = await get_limiter().aacquire(old_url)
+        t0 = time.monotonic()
+        try:
+            await next_btn.click()
+            await page.wait_for_url(lambda u: u != old_url, timeout=timeout_ms)
+            await page.wait_for_load_state("domcontentloaded", timeout=timeout_ms)
+            await page.wait_for_function(f"(old) => {{ const h = ({_FIRST_CARD_JS})(); return h && h !== old; }}",
+                                         arg=old_first, timeout=timeout_ms)
+        except Exception:
+            if lim is not None:
+                lim.report(error=True)
+            raise
+        if lim is not None:
+            lim.report(elapsed=time.monotonic() - t0)
+        return True
+
+    def open_search(self, url: str):
+        self.service._call(self._aopen_search(url))
+
+    def search_html(self) -> str:
+        return self.service._call(self._asearch_html())
+
+    def next_search_page(self) -> bool:
+        return self.service._call(self._anext_search_page())
+
+
+_service: BrowserService | None = None
+_service_lock = threading.Lock()
+
+
+def get_browser() -> BrowserService:
+    """Browserul partajat al procesului (pornit lazy, oprit la exit)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = BrowserService()
+            atexit.register(_service.shutdown)
+        return _service
+
+
+def browser_metrics() -> dict:
+    with _service_lock:
+        svc = _service
+    return svc.metrics() if svc is not None else {"connected": False, "launches": 0}
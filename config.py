@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 @dataclass
 class Settings:
     # Ollama
     OLLAMA_BASE_URL: str = "http://192.168.0.136:11434"
     DEFAULT_MODEL: str = "deepseek-r1:8b"
+    JUDGE_MODEL: str = "deepseek-r1:8b"
     SECRET_KEY: str = "dev-secret-change-in-production"
 
     # OLX
@@ -16,11 +17,96 @@ class Settings:
     OLLAMA_TIMEOUT_CONNECT: int = 5
     OLLAMA_TIMEOUT_READ: int = 600
     OLLAMA_RETRIES: int = 2
+    # Mai multe servere Ollama: {url: request-uri simultane}. Gol = doar OLLAMA_BASE_URL, câte unul.
+    OLLAMA_ENDPOINTS: dict[str, int] = field(default_factory=dict)
+    OLLAMA_MODEL_CONCURRENCY: dict[str, int] = field(default_factory=dict)  # limită per model, pe tot pool-ul
+    OLLAMA_HEALTH_INTERVAL_S: float = 30.0
+    OLLAMA_HEALTH_TIMEOUT: float = 5.0
+    OLLAMA_ENDPOINT_COOLDOWN_S: float = 30.0
+    OLLAMA_KEEP_ALIVE: str = "30m"  # cât rămâne modelul în memorie după ultimul request
+    OLLAMA_WARMUP: bool = True      # încarcă model + judge_model la începutul run-ului
+    # câmpul "think" e respectat de Ollama >= 0.9; pe servere mai vechi (sau cu versiune
+    # necunoscută) apelurile cu think=False nu primesc stop / num_predict, altfel
+    # răspunsul s-ar tăia chiar în <think>
+    OLLAMA_THINK_MIN_VERSION: tuple[int, ...] = (0, 9, 0)
+    # Faze pe model: întâi intent + minimal pentru toate anunțurile, apoi verbose cu judge_model
+    LLM_PHASED: bool = False
+
+    # Controale de generare per tip de apel (label din ollama_generate):
+    # num_predict = max tokeni (cu think pornit: doar ai răspunsului, după </think>),
+    # stop = secvențe de oprire, think = raționament on/off
+    # (False scoate și pasul <think> din prompt), early_stop = "word" | "json":
+    # stream-ul se închide când eticheta / primul obiect JSON e complet
+    LLM_CALL_OPTIONS: dict[str, dict] = field(default_factory=lambda: {
+        "INTENT": {"num_predict": 16, "stop": ["\n"], "think": False, "early_stop": "word"},
+        "MINIMAL": {"num_predict": 1024, "early_stop": "json"},
+        "INTENT_MIN": {"num_predict": 1024, "early_stop": "json"},
+        "CABIN_MIN": {"num_predict": 512, "early_stop": "json"},
+        "CABIN_INTENT_MIN": {"num_predict": 512, "early_stop": "json"},
+        "VERBOSE": {"num_predict": 2048, "early_stop": "json"},
+        "CABIN_VERBOSE": {"num_predict": 2048, "early_stop": "json"},
+    })
+
+    # Cache răspunsuri LLM (SQLite): doar generări deterministe (temperature=0)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_DAYS: float = 30.0
+    LLM_CACHE_MAX_MB: float = 256.0
+    LLM_CACHE_EVICT_EVERY: int = 50  # evacuare TTL/LRU la fiecare N intrări noi
+    # Un singur apel LLM întoarce intent + JSON minimal (în loc de două apeluri per anunț)
+    LLM_COMBINED_INTENT: bool = False
+
+    # Pre-clasificator local de intent (reguli + naive Bayes); LLM-ul doar sub prag
+    INTENT_LOCAL_ENABLED: bool = True
+    INTENT_LOCAL_MIN_CONF: float = 0.85
+    INTENT_MODEL_PATH: str = "data/intent_nb.json"
 
     # Scrape limits
     MAX_PAGES: int = 10
     MAX_ADS_PER_RUN: int = 20
-    MIN_SECONDS_BETWEEN_PAGES: float = 1.2
+    AD_FETCH_CONCURRENCY: int = 4   # pagini de anunț încărcate simultan
+    SEARCH_PAGE_CONCURRENCY: int = 3  # pagini de rezultate (?page=N) încărcate simultan
+
+    # "browser" = Playwright pentru fiecare anunț; "http" = requests (fallback pe browser);
+    # "replay" = paginile salvate în snapshot store, fără rețea
+    FETCH_MODE: str = "browser"
+
+    # Browser partajat (un Chromium per proces)
+    BROWSER_HEADLESS: bool = True
+    BROWSER_MAX_RSS_MB: int = 1500  # peste => restart Chromium când e liber
+    BROWSER_CALL_TIMEOUT_S: float = 180.0  # plafon pentru orice apel sincron în loop-ul Playwright
+
+    # Filtrare rețea în Playwright: doar first-party și doar tipurile de care avem nevoie
+    BLOCK_RESOURCES: bool = True
+    FIRST_PARTY_HOSTS: tuple[str, ...] = ("olx.ro",)
+    ALLOWED_RESOURCE_TYPES: tuple[str, ...] = ("document", "script", "xhr", "fetch")
+
+    # Pipeline (fetch -> parse -> LLM -> DB)
+    PIPELINE_QUEUE_SIZE: int = 8
+    PIPELINE_PARSE_WORKERS: int = 2
+    PIPELINE_LLM_WORKERS: int = 1   # minim; efectiv max(asta, suma limitelor din OLLAMA_ENDPOINTS)
+
+    # Rate limit adaptiv per host: (rate/s inițial, burst, rate minim, rate maxim, "lent" după N s)
+    RATE_LIMITS: dict[str, tuple] = field(default_factory=lambda: {
+        "olx.ro": (1.0, 3, 0.1, 6.0, 8.0),
+        "nominatim.openstreetmap.org": (1.0, 1, 0.1, 1.0, None),  # politica Nominatim: max 1 req/s
+    })
+    OLLAMA_RATE_LIMIT: tuple = (10.0, 4, 0.2, 20.0, None)
+
+    # Anunțuri deja în DB mai noi de atât nu se mai deschid / analizează (0 = mereu re-analizează)
+    SEEN_AD_TTL_HOURS: float = 72.0
+
+    # Watch mode: newest-first, oprire la un șir de anunțuri deja văzute
+    WATCH_INTERVAL_MIN: float = 15.0
+    WATCH_MAX_PAGES: int = 5
+    WATCH_STOP_AFTER_SEEN: int = 6  # > nr. de anunțuri promovate din capul listei
+    WATCH_HEAD_SIZE: int = 10       # câte URL-uri din capul listei țin minte ca high-water mark
+    WATCH_SEEN_TTL_DAYS: float = 30.0
+
+    # Snapshot store: HTML brut comprimat, adresat prin sha256 (opt-in)
+    SNAPSHOTS_ENABLED: bool = False
+    SNAPSHOT_DIR: str = "data/snapshots"
+    SNAPSHOT_MAX_MB: float = 2048.0
+    SNAPSHOT_GZIP_LEVEL: int = 6
 
     # Distance reference (Cluj-Napoca)
     CLUJ_LAT: float = 46.7712
@@ -1,7 +1,7 @@
 import sqlite3
 from pathlib import Path
 import json
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 DB_PATH = Path("data/olx.db")
 
@@ -70,8 +70,144 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_ads_profile_id ON ads(profile_id);
         CREATE INDEX IF NOT EXISTS idx_ads_score ON ads(score);
         CREATE INDEX IF NOT EXISTS idx_ads_scraped_at ON ads(scraped_at);
+
+        -- watch mode: high-water mark per (profil, query) + URL-urile deja trecute prin watch
+        CREATE TABLE IF NOT EXISTS watch_state (
+            profile_id INTEGER NOT NULL,     -- 0 = fără profil (CLI)
+            query TEXT NOT NULL,
+            head_urls_json TEXT NOT NULL,    -- primele anunțuri (cele mai noi) din ultimul pass
+            last_pass_at TEXT,
+            passes INTEGER NOT NULL DEFAULT 0,
+            last_new INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (profile_id, query)
+        );
+
+        CREATE TABLE IF NOT EXISTS watch_seen (
+            profile_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            seen_at TEXT NOT NULL,
+            PRIMARY KEY (profile_id, url)
+        );
+        CREATE INDEX IF NOT EXISTS idx_watch_seen_at ON watch_seen(seen_at);
+
+        -- run-uri checkpointate: ce query-uri / pagini s-au terminat și ce s-a întâmplat cu fiecare URL
+        CREATE TABLE IF NOT EXISTS runs (
+            id TEXT PRIMARY KEY,
+            profile_id INTEGER,
+            model TEXT,
+            params_json TEXT NOT NULL,       -- queries, pages, max_ads, fetch_mode
+            status TEXT NOT NULL,            -- running | done | failed | cancelled | interrupted
+            error TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS run_queries (
+            run_id TEXT NOT NULL,
+            query TEXT NOT NULL,
+            collected INTEGER NOT NULL DEFAULT 0,
+            done_at TEXT,
+            PRIMARY KEY (run_id, query),
+            FOREIGN KEY(run_id) REFERENCES runs(id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS run_pages (
+            run_id TEXT NOT NULL,
+            query TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            done_at TEXT,
+            PRIMARY KEY (run_id, query, page),
+            FOREIGN KEY(run_id) REFERENCES runs(id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS run_items (
+            run_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            query TEXT NOT NULL,
+            stage TEXT NOT NULL,             -- queued | judging | prefiltered | dropped | saved | error
+            reason TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (run_id, url),
+            FOREIGN KEY(run_id) REFERENCES runs(id) ON DELETE CASCADE
+        );
+
+        -- HTML brut comprimat (snapshots.py): fișier per sha256, url -> ultimul sha
+        CREATE TABLE IF NOT EXISTS snapshots (
+            sha TEXT PRIMARY KEY,
+            size_raw INTEGER,
+            size_gz INTEGER,
+            created_at TEXT,
+            last_used_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_snapshots_last_used ON snapshots(last_used_at);
+
+        CREATE TABLE IF NOT EXISTS snapshot_urls (
+            url TEXT PRIMARY KEY,
+            sha TEXT NOT NULL,
+            fetched_at TEXT
+        );
+
+        -- răspunsuri Ollama (llm_cache.py): key = sha256(model + prompt + options)
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+
+        -- intent per anunț (intent_local.py): etichetele LLM sunt datele de antrenare
+        CREATE TABLE IF NOT EXISTS ad_intents (
+            url TEXT PRIMARY KEY,
+            title TEXT,
+            description TEXT,
+            intent TEXT NOT NULL,
+            source TEXT NOT NULL,           -- llm | local
+            confidence REAL,
+            model TEXT,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ad_intents_source ON ad_intents(source);
         """)
+        # migrări: coloane adăugate după crearea tabelei ads
+        _ensure_columns(con, "ads", {
+            "snapshot_sha": "TEXT",
+            "snapshot_at": "TEXT",
+        })
+        _canonicalize_ad_urls(con)
         con.commit()
+
+def _ensure_columns(con, table: str, cols: dict[str, str]):
+    have = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+    for name, decl in cols.items():
+        if name not in have:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def _canonicalize_ad_urls(con):
+    """
+    Migrare: rândurile salvate înainte de URL-urile canonice (?reason=..., #...)
+    trec pe forma canonică, altfel lookup-urile canonice nu le găsesc și anunțul
+    se re-analizează într-un rând nou. La duplicat rămâne rândul analizat ultimul.
+    După prima rulare query-ul nu mai găsește nimic.
+    """
+    from extract import canonical_ad_url
+
+    rows = con.execute("SELECT id, url, scraped_at FROM ads WHERE url LIKE '%?%' OR url LIKE '%#%'").fetchall()
+    for ad_id, url, scraped_at in rows:
+        canon = canonical_ad_url(url)
+        if canon == url:
+            continue
+        other = con.execute("SELECT id, scraped_at FROM ads WHERE url=?", (canon,)).fetchone()
+        if other is not None and (other[1] or "") >= (scraped_at or ""):
+            con.execute("DELETE FROM ads WHERE id=?", (ad_id,))
+            continue
+        if other is not None:
+            con.execute("DELETE FROM ads WHERE id=?", (other[0],))
+        con.execute("UPDATE ads SET url=? WHERE id=?", (canon, ad_id))
+
 def upsert_ad(ad: dict):
     # IMPORTANT: cheile din ad trebuie să corespundă exact acestor coloane
     cols = [
@@ -83,6 +219,7 @@ def upsert_ad(ad: dict):
         "confidence", "signals_positive", "signals_negative", "quick_tests", "repair_items",
         "resale_value_low", "resale_value_high", "profit_low", "profit_high", "drive_time_min",
         "parse_ok", "judge_error", "notes",
+        "snapshot_sha", "snapshot_at",
     ]
 
     def _sql_value(v):
@@ -134,7 +271,9 @@ def upsert_ad(ad: dict):
 
             parse_ok=excluded.parse_ok,
             judge_error=excluded.judge_error,
-            notes=excluded.notes
+            notes=excluded.notes,
+            snapshot_sha=COALESCE(excluded.snapshot_sha, ads.snapshot_sha),
+            snapshot_at=COALESCE(excluded.snapshot_at, ads.snapshot_at)
         """, values)
         con.commit()
 
@@ -162,6 +301,198 @@ def list_ads(limit=200, min_score=None, profile_id=None):
         rows = con.execute(q, params).fetchall()
         return [dict(r) for r in rows]
 
+def get_seen_ads(urls: list[str]) -> dict[str, str | None]:
+    """
+    Lookup bulk: care din url-urile date există deja în ads.
+    Întoarce {url: scraped_at}. Un singur query pe apel (pagina de căutare).
+    ads.url e unic pe tot tabelul (un rând per anunț, indiferent de profil),
+    deci lookup-ul e doar după url.
+    """
+    urls = list(dict.fromkeys(u for u in (urls or []) if u))
+    if not urls:
+        return {}
+
+    q = f"SELECT url, scraped_at FROM ads WHERE url IN ({','.join(['?'] * len(urls))})"
+    with connect() as con:
+        rows = con.execute(q, urls).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+def get_watch_state(profile_id: int | None, query: str) -> dict | None:
+    with connect() as con:
+        con.row_factory = sqlite3.Row
+        r = con.execute("SELECT * FROM watch_state WHERE profile_id=? AND query=?",
+                        (profile_id or 0, query)).fetchone()
+        if not r:
+            return None
+        d = dict(r)
+        d["head_urls"] = json.loads(d["head_urls_json"])
+        return d
+
+def save_watch_state(profile_id: int | None, query: str, head_urls: list[str], new_ads: int):
+    with connect() as con:
+        con.execute("""
+            INSERT INTO watch_state (profile_id, query, head_urls_json, last_pass_at, passes, last_new)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(profile_id, query) DO UPDATE SET
+              head_urls_json=excluded.head_urls_json,
+              last_pass_at=excluded.last_pass_at,
+              passes=watch_state.passes + 1,
+              last_new=excluded.last_new
+        """, (profile_id or 0, query, json.dumps(head_urls, ensure_ascii=False), _now_utc(), new_ads))
+        con.commit()
+
+def get_watch_seen(profile_id: int | None, urls: list[str]) -> set[str]:
+    urls = list(dict.fromkeys(u for u in (urls or []) if u))
+    if not urls:
+        return set()
+    with connect() as con:
+        rows = con.execute(
+            f"SELECT url FROM watch_seen WHERE profile_id=? AND url IN ({','.join(['?'] * len(urls))})",
+            [profile_id or 0, *urls],
+        ).fetchall()
+        return {r[0] for r in rows}
+
+def add_watch_seen(profile_id: int | None, urls: list[str]):
+    if not urls:
+        return
+    now = _now_utc()
+    with connect() as con:
+        con.executemany("INSERT OR IGNORE INTO watch_seen (profile_id, url, seen_at) VALUES (?, ?, ?)",
+                        [(profile_id or 0, u, now) for u in urls])
+        con.commit()
+
+def prune_watch_seen(max_age_days: float):
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat()
+    with connect() as con:
+        con.execute("DELETE FROM watch_seen WHERE seen_at < ?", (cutoff,))
+        con.commit()
+
+def create_run_row(run_id: str, profile_id: int | None, model: str, params: dict):
+    now = _now_utc()
+    with connect() as con:
+        con.execute("""
+            INSERT INTO runs (id, profile_id, model, params_json, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'running', ?, ?)
+        """, (run_id, profile_id, model, json.dumps(params, ensure_ascii=False), now, now))
+        con.commit()
+
+def get_run(run_id: str) -> dict | None:
+    with connect() as con:
+        con.row_factory = sqlite3.Row
+        r = con.execute("SELECT * FROM runs WHERE id=?", (run_id,)).fetchone()
+        if not r:
+            return None
+        d = dict(r)
+        d["params"] = json.loads(d["params_json"])
+        return d
+
+def list_runs(limit: int = 50) -> list[dict]:
+    with connect() as con:
+        con.row_factory = sqlite3.Row
+        rows = con.execute("""
+            SELECT r.*,
+              (SELECT COUNT(*) FROM run_queries q WHERE q.run_id = r.id AND q.done_at IS NOT NULL) AS queries_done,
+              (SELECT COUNT(*) FROM run_items i WHERE i.run_id = r.id AND i.stage = 'saved') AS saved,
+              -- de reluat la resume: stări nefinale (queued / judging / error) din query-urile neterminate
+              (SELECT COUNT(*) FROM run_items i
+                 WHERE i.run_id = r.id AND i.stage NOT IN ('prefiltered', 'dropped', 'saved')
+                   AND NOT EXISTS (SELECT 1 FROM run_queries q
+                                   WHERE q.run_id = i.run_id AND q.query = i.query AND q.done_at IS NOT NULL)) AS pending
+            FROM runs r ORDER BY r.created_at DESC LIMIT ?
+        """, (limit,)).fetchall()
+        out = []
+        for r in rows:
+            d = dict(r)
+            d["params"] = json.loads(d["params_json"])
+            out.append(d)
+        return out
+
+def set_run_status(run_id: str, status: str, error: str | None = None):
+    with connect() as con:
+        con.execute("UPDATE runs SET status=?, error=?, updated_at=? WHERE id=?", (status, error, _now_utc(), run_id))
+        con.commit()
+
+def mark_interrupted_runs():
+    """La pornire: run-urile rămase 'running' aparțin unui proces mort."""
+    with connect() as con:
+        con.execute("UPDATE runs SET status='interrupted', updated_at=? WHERE status='running'", (_now_utc(),))
+        con.commit()
+
+def done_queries(run_id: str) -> set[str]:
+    with connect() as con:
+        rows = con.execute("SELECT query FROM run_queries WHERE run_id=? AND done_at IS NOT NULL", (run_id,)).fetchall()
+        return {r[0] for r in rows}
+
+def mark_query_done(run_id: str, query: str, collected: int):
+    with connect() as con:
+        con.execute("""
+            INSERT INTO run_queries (run_id, query, collected, done_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(run_id, query) DO UPDATE SET collected=excluded.collected, done_at=excluded.done_at
+        """, (run_id, query, collected, _now_utc()))
+        con.commit()
+
+def done_pages(run_id: str, query: str) -> set[int]:
+    with connect() as con:
+        rows = con.execute("SELECT page FROM run_pages WHERE run_id=? AND query=?", (run_id, query)).fetchall()
+        return {r[0] for r in rows}
+
+def mark_page_done(run_id: str, query: str, page: int):
+    with connect() as con:
+        con.execute("INSERT OR REPLACE INTO run_pages (run_id, query, page, done_at) VALUES (?, ?, ?, ?)",
+                    (run_id, query, page, _now_utc()))
+        con.commit()
+
+def set_run_items(run_id: str, query: str, urls: list[str], stage: str, reason: str | None = None):
+    if not urls:
+        return
+    now = _now_utc()
+    with connect() as con:
+        con.executemany("""
+            INSERT INTO run_items (run_id, url, query, stage, reason, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(run_id, url) DO UPDATE SET stage=excluded.stage, reason=excluded.reason, updated_at=excluded.updated_at
+        """, [(run_id, u, query, stage, reason, now) for u in urls])
+        con.commit()
+
+def get_run_items(run_id: str, query: str | None = None) -> dict[str, str]:
+    """{url: stage} în ordinea în care au fost înregistrate."""
+    q = "SELECT url, stage FROM run_items WHERE run_id=?"
+    params: list = [run_id]
+    if query is not None:
+        q += " AND query=?"
+        params.append(query)
+    with connect() as con:
+        rows = con.execute(q + " ORDER BY rowid", params).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+def save_ad_intent(url: str, title: str, description: str, intent: str, source: str,
+                   confidence: float | None = None, model: str | None = None):
+    """O etichetă 'local' nu suprascrie una venită de la LLM."""
+    with connect() as con:
+        con.execute("""
+            INSERT INTO ad_intents (url, title, description, intent, source, confidence, model, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+              title=excluded.title, description=excluded.description, intent=excluded.intent,
+              source=excluded.source, confidence=excluded.confidence, model=excluded.model,
+              created_at=excluded.created_at
+            WHERE excluded.source = 'llm' OR ad_intents.source != 'llm'
+        """, (url, title, description, intent, source, confidence, model, _now_utc()))
+        con.commit()
+
+def list_ad_intents(source: str | None = "llm", limit: int | None = None) -> list[dict]:
+    q = "SELECT url, title, description, intent, source, confidence FROM ad_intents"
+    params: list = []
+    if source is not None:
+        q += " WHERE source=?"
+        params.append(source)
+    q += " ORDER BY created_at"
+    if limit:
+        q += " LIMIT ?"
+        params.append(limit)
+    with connect() as con:
+        con.row_factory = sqlite3.Row
+        return [dict(r) for r in con.execute(q, params).fetchall()]
+
 def get_ad(ad_id: int):
     with connect() as con:
         con.row_factory = sqlite3.Row
@@ -8,8 +8,8 @@ from typing import Optional
 _lock = threading.Lock()
 _runs: dict[str, queue.Queue] = {}
 
-def create_run() -> str:
-    run_id = uuid.uuid4().hex
+def create_run(run_id: str | None = None) -> str:
+    run_id = run_id or uuid.uuid4().hex
     with _lock:
         _runs[run_id] = queue.Queue()
     return run_id
@@ -0,0 +1,363 @@
+# extract.py
+import re
+import json
+import html as _html
+import threading
+from collections import Counter
+from functools import cached_property
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+
+# lxml e mult mai rapid pe paginile OLX (sute de KB); html.parser rămâne fallback
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+PRICE_RE = re.compile(r"(\d[\d\.\s]*)")
+DISTANCE_RE = re.compile(r"(\d+)\s*km")
+NEXT_DATA_RE = re.compile(r"<script[^>]*\bid=[\"']__NEXT_DATA__[\"'][^>]*>(.*?)</script>", re.DOTALL | re.IGNORECASE)
+TAG_BREAK_RE = re.compile(r"<br\s*/?>|</p>|</div>|</li>", re.IGNORECASE)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# câte documente / câte câmpuri au avut nevoie de fallback pe DOM (proces-wide)
+_stats_lock = threading.Lock()
+_stats = Counter()
+
+
+def extract_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def html_to_text(s: str | None) -> str | None:
+    if not s:
+        return None
+    s = TAG_BREAK_RE.sub("\n", s)
+    s = _html.unescape(TAG_RE.sub("", s))
+    lines = [line.strip() for line in s.splitlines()]
+    return "\n".join(line for line in lines if line) or None
+
+
+def parse_price_ron(text: str | None):
+    if not text:
+        return None
+    t = text.replace("\xa0", " ").lower()
+    m = PRICE_RE.search(t)
+    if not m:
+        return None
+    digits = m.group(1).replace(".", "").replace(" ", "")
+    try:
+        return int(digits)
+    except Exception:
+        return None
+
+
+def normalize_city(loc: str) -> str:
+    parts = [p.strip() for p in (loc or "").split(",") if p.strip()]
+    if not parts:
+        return ""
+    if len(parts) >= 2:
+        return parts[1]
+    return parts[0]
+
+
+def extract_coords_from_next(next_data: dict):
+    try:
+        props = next_data.get("props", {})
+        page = props.get("pageProps", {})
+        offer = page.get("offer") or page.get("ad") or page.get("data")
+        if isinstance(offer, dict):
+            loc = offer.get("location") or {}
+            coords = loc.get("coordinates")
+            if isinstance(coords, dict):
+                lat = coords.get("latitude") or coords.get("lat")
+                lon = coords.get("longitude") or coords.get("lon")
+                if lat and lon:
+                    return float(lat), float(lon)
+            lat = loc.get("lat") or offer.get("latitude")
+            lon = loc.get("lon") or offer.get("longitude")
+            if lat and lon:
+                return float(lat), float(lon)
+    except Exception:
+        pass
+    return None
+
+
+class AdDocument:
+    """
+    O pagină de anunț OLX, parsată cel mult O SINGURĂ DATĂ.
+
+    Câmpurile se citesc întâi din JSON-ul ofertei din __NEXT_DATA__ (scos cu
+    regex, fără DOM). Soup-ul se construiește doar dacă un câmp lipsește din
+    JSON; fiecare astfel de fallback e numărat în extract_stats().
+    """
+
+    def __init__(self, html: str):
+        self.html = html or ""
+        self.fallbacks: list[str] = []
+        _count("docs")
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        _count("dom_parse")
+        return BeautifulSoup(self.html, HTML_PARSER)
+
+    def _fallback(self, field: str):
+        self.fallbacks.append(field)
+        _count(f"fallback:{field}")
+
+    # ---- JSON (__NEXT_DATA__) ----
+
+    @cached_property
+    def next_data(self) -> dict | None:
+        m = NEXT_DATA_RE.search(self.html)
+        if not m:
+            return None
+        try:
+            return json.loads(m.group(1))
+        except Exception:
+            return None
+
+    @cached_property
+    def offer(self) -> dict | None:
+        try:
+            page = self.next_data.get("props", {}).get("pageProps", {})
+            offer = page.get("offer") or page.get("ad") or page.get("data")
+        except Exception:
+            return None
+        return offer if isinstance(offer, dict) else None
+
+    def _json_title(self):
+        t = (self.offer or {}).get("title")
+        return t.strip() if isinstance(t, str) and t.strip() else None
+
+    def _json_desc(self):
+        d = (self.offer or {}).get("description")
+        return html_to_text(d) if isinstance(d, str) else None
+
+    def _json_price(self):
+        p = (self.offer or {}).get("price")
+        if isinstance(p, dict):
+            p = (p.get("regularPrice") or {}).get("value") if isinstance(p.get("regularPrice"), dict) else p.get("value")
+        try:
+            return int(float(p)) if p is not None else None
+        except Exception:
+            return None
+
+    def _json_location(self):
+        loc = (self.offer or {}).get("location")
+        if not isinstance(loc, dict):
+            return None
+        city = loc.get("cityName") or loc.get("city")
+        if isinstance(city, dict):
+            city = city.get("name")
+        return city.strip() if isinstance(city, str) and city.strip() else None
+
+    def _json_image(self):
+        photos = (self.offer or {}).get("photos") or []
+        if not isinstance(photos, list) or not photos:
+            return None
+        ph = photos[0]
+        if isinstance(ph, dict):
+            ph = ph.get("link") or ph.get("url")
+        if not isinstance(ph, str) or not ph:
+            return None
+        # OLX pune template-uri de dimensiune în link
+        return ph.replace("{width}", "1000").replace("{height}", "700")
+
+    # ---- DOM (fallback) ----
+
+    def _dom_title(self):
+        h1 = self.soup.find("h1")
+        if h1:
+            t = h1.get_text(strip=True)
+            if t:
+                return t
+        ogt = self.soup.find("meta", property="og:title")
+        if ogt and ogt.get("content"):
+            return ogt["content"].strip()
+        return None
+
+    def _dom_desc(self):
+        for sel in [
+            "div[data-cy='ad_description']",
+            "div[data-testid='ad-description']",
+            "div#textContent"
+        ]:
+            node = self.soup.select_one(sel)
+            if node:
+                return node.get_text("\n", strip=True)
+        return None
+
+    def _dom_price(self):
+        meta_price = self.soup.find("meta", property="product:price:amount")
+        if meta_price and meta_price.get("content"):
+            try:
+                return int(float(meta_price["content"]))
+            except Exception:
+                pass
+
+        price_node = self.soup.find(attrs={"data-testid": "ad-price-container"})
+        if price_node:
+            return parse_price_ron(price_node.get_text(" ", strip=True))
+        return None
+
+    def _dom_location(self):
+        img = self.soup.select_one(".qa-static-ad-map-container img[alt]")
+        if img and img.get("alt"):
+            full = img["alt"].strip()
+            city = normalize_city(full)
+            return city or full
+        return None
+
+    def _dom_image(self):
+        og = self.soup.find("meta", property="og:image")
+        if og and og.get("content"):
+            return og["content"]
+        img = self.soup.find("img")
+        return img["src"] if img and img.get("src") else None
+
+    # ---- câmpuri publice: JSON întâi, DOM doar la miss ----
+
+    def _field(self, name: str, from_json, from_dom):
+        v = from_json()
+        if v is not None:
+            return v
+        self._fallback(name)
+        return from_dom()
+
+    @cached_property
+    def title(self) -> str | None:
+        return self._field("title", self._json_title, self._dom_title)
+
+    @cached_property
+    def desc(self) -> str | None:
+        return self._field("desc", self._json_desc, self._dom_desc)
+
+    @cached_property
+    def price(self) -> int | None:
+        return self._field("price", self._json_price, self._dom_price)
+
+    @cached_property
+    def location(self) -> str | None:
+        return self._field("location", self._json_location, self._dom_location)
+
+    @cached_property
+    def image(self) -> str | None:
+        return self._field("image", self._json_image, self._dom_image)
+
+    @cached_property
+    def distance_km(self) -> float | None:
+        # distanța nu e în JSON; nu construim DOM-ul dacă markerul lipsește din HTML
+        if "distance-field" not in self.html:
+            return None
+        d = self.soup.select_one("[data-testid='distance-field']")
+        if not d:
+            return None
+        m = DISTANCE_RE.search(d.get_text(strip=True).lower())
+        if m:
+            return float(m.group(1))
+        return None
+
+    @cached_property
+    def coords(self) -> tuple[float, float] | None:
+        if not self.next_data:
+            return None
+        return extract_coords_from_next(self.next_data)
+
+    def fields(self) -> dict:
+        return {
+            "title": self.title,
+            "desc": self.desc,
+            "price": self.price,
+            "loc": self.location,
+            "img": self.image,
+            "dist": self.distance_km,
+            "coords": self.coords,
+        }
+
+
+def canonical_ad_url(href: str, base: str = "https://www.olx.ro") -> str:
+    """
+    Forma canonică a unui URL de anunț: absolut, host lowercase, fără query
+    (?reason=..., tracking) și fără fragment (#...). Un anunț = un URL.
+    """
+    full = href if href.startswith("http") else urljoin(base, href)
+    parts = urlsplit(full)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, "", ""))
+
+
+def _card_text(card, selectors: list[str]) -> str | None:
+    for sel in selectors:
+        node = card.select_one(sel)
+        if node:
+            t = node.get_text(" ", strip=True)
+            if t:
+                return t
+    return None
+
+
+PAGE_PARAM_RE = re.compile(r"[?&]page=(\d+)")
+
+
+class SearchPage:
+    """O pagină de rezultate OLX, parsată o singură dată: carduri + paginare."""
+
+    def __init__(self, html: str, base: str):
+        self.html = html or ""
+        self.base = base
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return BeautifulSoup(self.html, HTML_PARSER)
+
+    @cached_property
+    def cards(self) -> list[dict]:
+        """
+        Link-urile de anunț, în ordine, fiecare cu ce arată cardul din listă
+        (titlu, preț, locație), fără să deschidem anunțul. Câmpurile lipsă rămân None.
+        """
+        cards: dict[str, dict] = {}
+        for a in self.soup.find_all("a", href=True):
+            href = a["href"]
+            if "/d/oferta/" not in href and "/oferta/" not in href:
+                continue
+            full = canonical_ad_url(href, self.base)
+            card = cards.setdefault(full, {"url": full, "title": None, "price": None, "location": None})
+            if card["title"] is not None:
+                continue
+
+            node = a.find_parent(attrs={"data-cy": "l-card"}) or a.find_parent(attrs={"data-testid": "l-card"})
+            if node is None:
+                continue
+            card["title"] = _card_text(node, ["[data-cy='ad-card-title'] h4", "[data-cy='ad-card-title'] h6", "h4", "h6"])
+            card["price"] = parse_price_ron(_card_text(node, ["[data-testid='ad-price']"]))
+            loc = _card_text(node, ["[data-testid='location-date']"])
+            # "Cluj-Napoca - Azi la 10:00" => "Cluj-Napoca"
+            card["location"] = loc.split(" - ")[0].strip() if loc else None
+        return list(cards.values())
+
+    @cached_property
+    def page_count(self) -> int | None:
+        """Ultima pagină din paginare (None dacă nu o putem citi)."""
+        nums = []
+        for a in self.soup.select("[data-testid='pagination-list'] a, a[data-testid^='pagination-link']"):
+            t = a.get_text(strip=True)
+            if t.isdigit():
+                nums.append(int(t))
+            m = PAGE_PARAM_RE.search(a.get("href") or "")
+            if m:
+                nums.append(int(m.group(1)))
+        return max(nums) if nums else None
+
+
+def extract_search_cards(html: str, base: str) -> list[dict]:
+    return SearchPage(html, base).cards
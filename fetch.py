@@ -0,0 +1,94 @@
+# fetch.py
+import time
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+from ratelimit import get_limiter, parse_retry_after
+
+# "replay" = doar din snapshot store (snapshots.py), fără rețea
+FETCH_MODES = ("browser", "http", "replay")
+
+# semne că nu am primit pagina reală a anunțului (anti-bot / challenge)
+CHALLENGE_MARKERS = ("captcha", "cf-challenge", "challenge-platform", "Just a moment...")
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """Sesiune HTTP partajată (keep-alive + pool de conexiuni) pentru tot procesul."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, settings.AD_FETCH_CONCURRENCY * 2))
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({
+                "User-Agent": settings.USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "ro-RO,ro;q=0.9,en;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+            })
+            _session = s
+        return _session
+
+
+def looks_like_ad_page(status: int, html: str) -> bool:
+    if status != 200 or not html:
+        return False
+    if "__NEXT_DATA__" not in html:
+        return False
+    head = html[:20000]
+    return not any(m in head for m in CHALLENGE_MARKERS)
+
+
+class HttpFetcher:
+    """
+    Pagini de anunț prin HTTP simplu (paginile OLX sunt randate pe server).
+    Dacă răspunsul nu arată ca un anunț (challenge, fără __NEXT_DATA__),
+    aceeași pagină se ia prin browser.
+    """
+
+    def __init__(self, browser=None):
+        self.browser = browser
+        self.session = http_session()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def fetch(self, url: str, timeout_ms: int = 30000) -> str:
+        timeout = (10, timeout_ms / 1000)
+        lim = get_limiter().acquire(url)
+        t0 = time.monotonic()
+        try:
+            r = self.session.get(url, timeout=timeout)
+            if lim is not None:
+                lim.report(status=r.status_code, elapsed=time.monotonic() - t0,
+                           retry_after=parse_retry_after(r.headers.get("Retry-After")))
+            html = r.text
+            if looks_like_ad_page(r.status_code, html):
+                self._count("http_ok")
+                self._count("http_bytes", len(r.content))
+                return html
+            self._count(f"http_miss:{r.status_code}")
+        except requests.RequestException:
+            if lim is not None:
+                lim.report(error=True)
+            self._count("http_error")
+
+        if self.browser is None:
+            raise RuntimeError(f"HTTP fetch failed and no browser fallback: {url}")
+        self._count("browser_fallback")
+        return self.browser.fetch(url, timeout_ms=timeout_ms)
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
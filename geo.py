@@ -1,6 +1,10 @@
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from config import settings
+from ratelimit import get_limiter
 
 def haversine_km(lat1, lon1, lat2, lon2):
     R = 6371.0
@@ -12,22 +16,79 @@ def haversine_km(lat1, lon1, lat2, lon2):
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R*c
 
-def geocode_nominatim(place: str):
-    # Fallback ONLY if OLX page doesn't expose coordinates.
+def _nominatim(place: str):
+    """(coords | None, definitiv): False la erori tranzitorii (timeout, 429, 5xx)."""
+    url = "https://nominatim.openstreetmap.org/search"
+    lim = get_limiter().acquire(url)
     try:
         r = requests.get(
-            "https://nominatim.openstreetmap.org/search",
+            url,
             params={"q": place, "format": "json", "limit": 1},
             headers={"User-Agent": settings.USER_AGENT},
             timeout=10,
         )
+        if lim is not None:
+            lim.report(status=r.status_code)
         r.raise_for_status()
         data = r.json()
         if not data:
-            return None
-        return float(data[0]["lat"]), float(data[0]["lon"])
+            return None, True  # locul nu există: rezultat sigur
+        return (float(data[0]["lat"]), float(data[0]["lon"])), True
+    except requests.RequestException as e:
+        if lim is not None and e.response is None:
+            lim.report(error=True)
+        return None, False
     except Exception:
-        return None
+        return None, False
+
+def geocode_nominatim(place: str):
+    # Fallback ONLY if OLX page doesn't expose coordinates.
+    return _nominatim(place)[0]
+
+GEO_CACHE_SIZE = 2048
+_geo_cache: dict[str, tuple[float, float] | None] = {}
+_geo_lock = threading.Lock()
+_geo_pending: set[str] = set()
+_geo_executor: ThreadPoolExecutor | None = None
+
+def geocode_cached(place: str):
+    # orașele se repetă mult între carduri / anunțuri => un singur apel per loc;
+    # eșecurile tranzitorii nu se păstrează, se reîncearcă data viitoare
+    with _geo_lock:
+        if place in _geo_cache:
+            return _geo_cache[place]
+    coords, definitive = _nominatim(place)
+    if definitive:
+        with _geo_lock:
+            if len(_geo_cache) >= GEO_CACHE_SIZE:
+                _geo_cache.pop(next(iter(_geo_cache)))
+            _geo_cache[place] = coords
+    return coords
+
+def _geocode_background(place: str):
+    try:
+        geocode_cached(place)
+    finally:
+        with _geo_lock:
+            _geo_pending.discard(place)
+
+def geocode_peek(place: str):
+    """
+    Fără așteptare: coordonatele din cache sau None. La miss, lookup-ul pleacă
+    în fundal (un singur thread, Nominatim are 1 req/s), ca un card ulterior din
+    același oraș să le găsească.
+    """
+    global _geo_executor
+    with _geo_lock:
+        if place in _geo_cache:
+            return _geo_cache[place]
+        if place in _geo_pending:
+            return None
+        _geo_pending.add(place)
+        if _geo_executor is None:
+            _geo_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocode")
+    _geo_executor.submit(_geocode_background, place)
+    return None
 
 def distance_from_cluj(lat, lon):
     if lat is None or lon is None:
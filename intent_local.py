@@ -0,0 +1,259 @@
+# intent_local.py
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from config import settings
+from keywords import fold
+
+LABELS = ("OFFER_SERVICE", "SELL_ITEM", "RENTAL", "WANTED", "IRRELEVANT")
+
+# (label, regex pe textul folded, greutate). O regulă contează o singură dată per anunț.
+# Greutățile sunt logit-uri: o regulă de 4 singură dă ~0.93, una de 1 singură ~0.40.
+RULES: list[tuple[str, str, float]] = [
+    ("OFFER_SERVICE", r"\brepar(?:am)?\b", 3.0),
+    ("OFFER_SERVICE", r"\breparatii\b", 2.0),
+    ("OFFER_SERVICE", r"\bservice\b", 1.5),
+    ("OFFER_SERVICE", r"\bla domiciliu\b", 2.0),
+    ("OFFER_SERVICE", r"\binterventii\b", 1.5),
+    ("OFFER_SERVICE", r"\batelier\b", 1.0),
+    ("OFFER_SERVICE", r"\b(?:instalari?|montaj|manopera)\b", 1.5),
+    ("WANTED", r"\bcumpar(?:am)?\b", 4.0),
+    ("WANTED", r"\bachizitionez\b", 4.0),
+    ("WANTED", r"\bcaut\b", 2.5),
+    ("RENTAL", r"\binchiriez\b", 4.0),
+    ("RENTAL", r"\bde inchiriat\b", 3.5),
+    ("RENTAL", r"\bcazare\b", 3.0),
+    ("RENTAL", r"(?:\bpe |/ ?)noapte\b", 2.0),
+    ("RENTAL", r"\b(?:booking|airbnb|check-?in)\b", 2.0),
+    ("RENTAL", r"\b(?:pensiune|cabana|chalet)\b", 1.0),
+    ("SELL_ITEM", r"\bvand\b", 4.0),
+    ("SELL_ITEM", r"\bvanzare\b", 2.5),
+    ("SELL_ITEM", r"\bpret fix\b", 2.0),
+    ("SELL_ITEM", r"\bnegociabil\b", 1.5),
+    ("SELL_ITEM", r"\bpentru piese\b", 1.5),
+    ("SELL_ITEM", r"\b(?:defect|stricat)\b", 1.0),
+]
+_RULES = [(label, re.compile(rx), w) for label, rx, w in RULES]
+
+_TOKEN = re.compile(r"[a-z0-9]{2,}")
+
+
+def tokens(folded: str) -> list[str]:
+    return _TOKEN.findall(folded)
+
+
+def _softmax(logits: dict[str, float]) -> dict[str, float]:
+    top = max(logits.values())
+    exp = {k: math.exp(v - top) for k, v in logits.items()}
+    z = sum(exp.values())
+    return {k: v / z for k, v in exp.items()}
+
+
+class NaiveBayes:
+    """
+    Naive Bayes multinomial pe tokenii din fold(titlu + descriere), cu netezire Laplace.
+    Se antrenează offline din intent-urile LLM salvate în ad_intents.
+    """
+
+    MIN_DOCS = 50  # sub atât modelul nu e folosit
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.docs: Counter = Counter()                          # label -> nr. anunțuri
+        self.totals: Counter = Counter()                        # label -> nr. tokeni
+        self.counts: dict[str, Counter] = defaultdict(Counter)  # label -> token -> nr.
+        self.vocab: set[str] = set()
+
+    @property
+    def n_docs(self) -> int:
+        return sum(self.docs.values())
+
+    def fit(self, texts: list[str], labels: list[str]) -> "NaiveBayes":
+        for text, label in zip(texts, labels):
+            toks = tokens(fold(text))
+            self.docs[label] += 1
+            self.totals[label] += len(toks)
+            self.counts[label].update(toks)
+            self.vocab.update(toks)
+        return self
+
+    def predict_proba(self, folded: str) -> dict[str, float]:
+        n, v = self.n_docs, len(self.vocab)
+        toks = [t for t in tokens(folded) if t in self.vocab]
+        logits = {}
+        for label in LABELS:
+            if not self.docs[label]:
+                continue
+            denom = self.totals[label] + self.alpha * v
+            c = self.counts[label]
+            logits[label] = math.log(self.docs[label] / n) + sum(
+                math.log((c[t] + self.alpha) / denom) for t in toks)
+        return _softmax(logits) if logits else {}
+
+    def to_dict(self) -> dict:
+        return {"alpha": self.alpha, "docs": dict(self.docs), "totals": dict(self.totals),
+                "counts": {k: dict(v) for k, v in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "NaiveBayes":
+        nb = cls(d.get("alpha", 1.0))
+        nb.docs.update(d["docs"])
+        nb.totals.update(d["totals"])
+        for label, c in d["counts"].items():
+            nb.counts[label].update(c)
+            nb.vocab.update(c)
+        return nb
+
+    def save(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "NaiveBayes | None":
+        try:
+            return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return None
+
+
+class IntentGuess(NamedTuple):
+    label: str
+    confidence: float
+    source: str  # rules | nb | rules+nb | none
+
+
+class IntentClassifier:
+    """
+    Intent local, fără LLM: logit = greutățile regulilor potrivite + log P(naive Bayes).
+    P din NB e amestecată cu uniforma (0.9 * p + 0.02), deci modelul statistic
+    cântărește cel mult cât o regulă puternică, iar un dezacord reguli / NB coboară
+    încrederea sub prag și trimite anunțul la LLM.
+    """
+
+    def __init__(self, nb: NaiveBayes | None = None):
+        self.nb = nb if nb is not None and nb.n_docs >= NaiveBayes.MIN_DOCS else None
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def rule_scores(self, folded: str) -> dict[str, float]:
+        scores = dict.fromkeys(LABELS, 0.0)
+        for label, rx, w in _RULES:
+            if rx.search(folded):
+                scores[label] += w
+        return scores
+
+    def classify(self, title: str, description: str) -> IntentGuess:
+        folded = fold(f"{title or ''}\n{description or ''}")
+        logits = self.rule_scores(folded)
+        ruled = any(logits.values())
+        nb_p = self.nb.predict_proba(folded) if self.nb is not None else {}
+        if not ruled and not nb_p:
+            return IntentGuess("IRRELEVANT", 1.0 / len(LABELS), "none")
+        for label in LABELS:
+            if nb_p:
+                logits[label] += math.log(0.9 * nb_p.get(label, 0.0) + 0.1 / len(LABELS))
+        p = _softmax(logits)
+        label = max(p, key=p.get)
+        source = "rules+nb" if ruled and nb_p else ("rules" if ruled else "nb")
+        return IntentGuess(label, p[label], source)
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+        out["nb_docs"] = self.nb.n_docs if self.nb is not None else 0
+        return out
+
+
+_classifier: IntentClassifier | None = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Clasificatorul partajat; modelul NB se încarcă din settings.INTENT_MODEL_PATH dacă există."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = IntentClassifier(NaiveBayes.load(settings.INTENT_MODEL_PATH))
+        return _classifier
+
+
+def intent_metrics() -> dict:
+    return get_intent_classifier().stats_snapshot()
+
+
+def _text(row: dict) -> str:
+    return f"{row.get('title') or ''}\n{row.get('description') or ''}"
+
+
+def train(rows: list[dict]) -> NaiveBayes:
+    return NaiveBayes().fit([_text(r) for r in rows], [r["intent"] for r in rows])
+
+
+def _holdout(url: str, folds: int = 5) -> bool:
+    return int(hashlib.md5(url.encode("utf-8")).hexdigest(), 16) % folds == 0
+
+
+def benchmark(rows: list[dict], threshold: float) -> dict:
+    """
+    Acord cu etichetele LLM pe un holdout fix (~20%, după hash-ul URL-ului), cu NB
+    antrenat pe restul: câte apeluri s-ar evita (încredere >= prag) și cât de des
+    eticheta locală coincide atunci cu cea a LLM-ului.
+    """
+    train_rows = [r for r in rows if not _holdout(r["url"])]
+    test_rows = [r for r in rows if _holdout(r["url"])]
+    out = {"train": len(train_rows), "test": len(test_rows), "threshold": threshold}
+    for name, clf in (("rules", IntentClassifier()), ("rules+nb", IntentClassifier(train(train_rows)))):
+        avoided = agree_avoided = agree_all = 0
+        misses = Counter()
+        for r in test_rows:
+            g = clf.classify(r["title"], r["description"])
+            agree_all += g.label == r["intent"]
+            if g.confidence >= threshold:
+                avoided += 1
+                if g.label == r["intent"]:
+                    agree_avoided += 1
+                else:
+                    misses[f"{r['intent']}->{g.label}"] += 1
+        n = len(test_rows) or 1
+        out[name] = {
+            "nb_used": clf.nb is not None,
+            "avoided_calls": avoided,
+            "avoided_pct": round(100.0 * avoided / n, 1),
+            "agreement_when_avoided_pct": round(100.0 * agree_avoided / avoided, 1) if avoided else None,
+            "agreement_argmax_pct": round(100.0 * agree_all / n, 1),
+            "top_disagreements": dict(misses.most_common(5)),
+        }
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    from db import init_db, list_ad_intents
+
+    ap = argparse.ArgumentParser(description="Pre-clasificator local de intent (reguli + naive Bayes)")
+    ap.add_argument("cmd", choices=["train", "bench"])
+    ap.add_argument("--threshold", type=float, default=settings.INTENT_LOCAL_MIN_CONF)
+    ap.add_argument("--out", default=settings.INTENT_MODEL_PATH)
+    args = ap.parse_args()
+
+    init_db()
+    rows = list_ad_intents("llm")
+    if args.cmd == "train":
+        nb = train(rows)
+        nb.save(args.out)
+        print(f"trained on {nb.n_docs} LLM labels {dict(nb.docs)} vocab={len(nb.vocab)} -> {args.out}")
+        if nb.n_docs < NaiveBayes.MIN_DOCS:
+            print(f"(sub {NaiveBayes.MIN_DOCS} exemple modelul nu va fi folosit, doar regulile)")
+    else:
+        print(json.dumps(benchmark(rows, args.threshold), ensure_ascii=False, indent=2))
@@ -0,0 +1,153 @@
+# jsonstream.py
+import json
+import re
+from typing import Any
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# în text liber ne interesează doar începutul unui bloc <think> sau al unui obiect JSON
+_TEXT_STOP = re.compile(r"[<{]")
+
+
+class JsonStream:
+    """
+    Scanner JSON incremental pentru output-ul LLM, alimentat bucată cu bucată.
+
+    - sare peste blocurile <think>...</think> și peste textul dinainte de JSON
+      (inclusiv ```json / ``` din Markdown)
+    - urmărește primul obiect JSON ({...}) caracter cu caracter (string-uri, escape, adâncime)
+    - fiecare câmp de pe primul nivel se parsează când se termină (la "," sau "}"),
+      deci feed() întoarce câmpurile noi imediat ce au sosit, iar obiectul final se
+      compune din ele, fără un al doilea parse pe tot textul
+    - dacă primul obiect nu e JSON valid, caută următorul după acolada lui de închidere
+
+    Fiecare caracter e scanat o singură dată (pos reține unde s-a rămas).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Stare nouă (de ex. la reîncercarea apelului LLM)."""
+        self.buf = ""
+        self.pos = 0
+        self.mode = "text"  # text | think | json | done
+        self.start = 0
+        self.depth = 0
+        self.in_str = False
+        self.esc = False
+        self.member_start = 0
+        self.valid = True
+        self.fields: dict[str, Any] = {}
+        self.value: dict | None = None
+
+    @property
+    def done(self) -> bool:
+        """Primul obiect JSON valid e complet (restul output-ului nu mai contează)."""
+        return self.mode == "done"
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Adaugă o bucată de output; întoarce câmpurile (cheie, valoare) terminate acum."""
+        if self.mode == "done" or not chunk:
+            return []
+        self.buf += chunk
+        buf, n, i = self.buf, len(self.buf), self.pos
+        out: list[tuple[str, Any]] = []
+
+        while i < n:
+            if self.mode == "text":
+                m = _TEXT_STOP.search(buf, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.start()
+                if buf[i] == "{":
+                    self._open(i)
+                    i += 1
+                    continue
+                tag = buf[i:i + len(THINK_OPEN)]
+                if tag == THINK_OPEN:
+                    self.mode = "think"
+                    i += len(THINK_OPEN)
+                elif len(tag) < len(THINK_OPEN) and THINK_OPEN.startswith(tag):
+                    break  # "<thi" la finalul bucății: așteptăm restul
+                else:
+                    i += 1
+
+            elif self.mode == "think":
+                j = buf.find(THINK_CLOSE, i)
+                if j == -1:
+                    # păstrăm coada: "</thi" poate continua în bucata următoare
+                    i = max(i, n - len(THINK_CLOSE) + 1)
+                    break
+                i = j + len(THINK_CLOSE)
+                self.mode = "text"
+
+            else:  # json
+                ch = buf[i]
+                if self.in_str:
+                    if self.esc:
+                        self.esc = False
+                    elif ch == "\\":
+                        self.esc = True
+                    elif ch == '"':
+                        self.in_str = False
+                elif ch == '"':
+                    self.in_str = True
+                elif ch in "{[":
+                    self.depth += 1
+                elif ch in "}]":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        out += self._member(i)
+                        closed = self._close(i)
+                        i += 1
+                        if closed:
+                            break
+                        # obiect invalid: căutăm următorul "{" după el, nu în interiorul lui
+                        # (un obiect imbricat nu e răspunsul)
+                        continue
+                elif ch == "," and self.depth == 1:
+                    out += self._member(i)
+                    self.member_start = i + 1
+                i += 1
+
+        self.pos = i
+        return out
+
+    def _open(self, i: int):
+        self.mode = "json"
+        self.start = i
+        self.depth = 1
+        self.in_str = self.esc = False
+        self.member_start = i + 1
+        self.valid = True
+        self.fields = {}
+
+    def _member(self, end: int) -> list[tuple[str, Any]]:
+        text = self.buf[self.member_start:end].strip()
+        if not text or not self.valid:
+            return []
+        try:
+            (key, value), = json.loads("{" + text + "}").items()
+        except ValueError:
+            self.valid = False
+            return []
+        self.fields[key] = value
+        return [(key, value)]
+
+    def _close(self, end: int) -> bool:
+        if self.valid and self.buf[end] == "}":
+            self.value = dict(self.fields)
+            self.mode = "done"
+            return True
+        self.mode = "text"
+        return False
+
+
+def parse_json(text: str | None) -> dict | None:
+    """Primul obiect JSON dintr-un răspuns LLM complet (None dacă nu există)."""
+    js = JsonStream()
+    js.feed(text or "")
+    return js.value
@@ -0,0 +1,103 @@
+# keywords.py
+import re
+import unicodedata
+from typing import NamedTuple
+
+
+def _build_fold_table() -> dict[int, str]:
+    # Latin cu diacritice -> litera de bază (ă/â -> a, î -> i, ș/ş -> s, ț/ţ -> t ...),
+    # câte un caracter pe caracter, ca pozițiile din textul "folded" să rămână valide
+    table = {}
+    for cp in range(0xC0, 0x250):
+        ch = chr(cp)
+        base = unicodedata.normalize("NFKD", ch)[0]
+        if base != ch and base.isascii():
+            table[cp] = base.lower()
+    return table
+
+
+_FOLD = _build_fold_table()
+
+
+def fold(text: str | None) -> str:
+    """lowercase + fără diacritice: "Vând" == "vand", "Închiriez" == "inchiriez"."""
+    return (text or "").lower().translate(_FOLD)
+
+
+class Hit(NamedTuple):
+    phrase: str  # fraza (folded) care a potrivit
+    start: int   # poziții în fold(text)
+    end: int
+
+
+def _trie_regex(words: list[str]) -> str:
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # sfârșit de frază
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Toate frazele într-un singur regex compilat (trie), aplicat o dată pe text:
+    costul nu mai crește cu numărul de fraze din profil.
+
+    Regex-ul găsește la fiecare poziție cea mai lungă frază; frazele conținute
+    în ea ("tv" în "tv defect") se adaugă din tabela precalculată `_inner`.
+    """
+
+    def __init__(self, phrases: list[str] | None):
+        folded = dict.fromkeys(pp for pp in (fold(p).strip() for p in (phrases or [])) if pp)
+        self.phrases: tuple[str, ...] = tuple(folded)
+        self._re = re.compile("(?=(" + _trie_regex(list(self.phrases)) + "))") if self.phrases else None
+        self._inner = {
+            p: [(q, off) for q in self.phrases if q != p for off in _offsets(p, q)]
+            for p in self.phrases
+        }
+
+    def __bool__(self):
+        return bool(self.phrases)
+
+    def scan(self, text: str, folded: bool = False) -> list[Hit]:
+        """Toate aparițiile, sortate după poziție."""
+        if self._re is None:
+            return []
+        t = text if folded else fold(text)
+        seen, hits = set(), []
+        for m in self._re.finditer(t):
+            p, start = m.group(1), m.start()
+            if not p:
+                continue
+            for q, off in [(p, 0)] + self._inner[p]:
+                key = (q, start + off)
+                if key not in seen:
+                    seen.add(key)
+                    hits.append(Hit(q, start + off, start + off + len(q)))
+        hits.sort(key=lambda h: (h.start, -len(h.phrase)))
+        return hits
+
+    def first(self, text: str, folded: bool = False) -> Hit | None:
+        hits = self.scan(text, folded)
+        return hits[0] if hits else None
+
+    def matched(self, text: str, folded: bool = False) -> set[str]:
+        return {h.phrase for h in self.scan(text, folded)}
+
+
+def _offsets(p: str, q: str) -> list[int]:
+    out, i = [], p.find(q)
+    while i != -1:
+        out.append(i)
+        i = p.find(q, i + 1)
+    return out
@@ -0,0 +1,110 @@
+# llm_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from config import settings
+from db import connect
+
+
+def cache_key(model: str, prompt: str, options: dict | None) -> str:
+    raw = json.dumps({"model": model, "prompt": prompt, "options": options or {}},
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cacheable(options: dict | None) -> bool:
+    # doar generările deterministe: la temperature > 0 același prompt nu dă același răspuns
+    return float((options or {}).get("temperature", 0.8)) == 0.0
+
+
+class LLMCache:
+    """
+    Cache persistent (tabela llm_cache) pentru răspunsurile Ollama, cheie =
+    sha256(model + prompt + options). Intrările mai vechi de ttl_days dispar,
+    iar peste max_mb se șterg cele folosite cel mai demult (LRU).
+    """
+
+    def __init__(self, ttl_days: float | None = None, max_mb: float | None = None):
+        self.ttl_s = (settings.LLM_CACHE_TTL_DAYS if ttl_days is None else ttl_days) * 86400
+        self.max_bytes = int((settings.LLM_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with connect() as con:
+            r = con.execute("SELECT response, created_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if r is None or (self.ttl_s > 0 and now - r[1] > self.ttl_s):
+                self._count("misses")
+                return None
+            con.execute("UPDATE llm_cache SET last_used=?, hits=hits+1 WHERE key=?", (now, key))
+            con.commit()
+        self._count("hits")
+        return r[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with connect() as con:
+            con.execute("""
+                INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_used, hits)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            """, (key, model, response, size, now, now))
+            con.commit()
+        self._count("stores")
+        with self._lock:
+            self._puts += 1
+            due = self._puts % settings.LLM_CACHE_EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        removed = 0
+        with connect() as con:
+            if self.ttl_s > 0:
+                removed += con.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_s,)).rowcount
+            total = con.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if self.max_bytes > 0 and total > self.max_bytes:
+                drop = []
+                for key, size in con.execute("SELECT key, size FROM llm_cache ORDER BY last_used ASC"):
+                    if total <= self.max_bytes:
+                        break
+                    drop.append((key,))
+                    total -= size
+                con.executemany("DELETE FROM llm_cache WHERE key=?", drop)
+                removed += len(drop)
+            con.commit()
+        self._count("evicted", removed)
+        return removed
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache | None:
+    """Cache-ul partajat al procesului; None dacă e dezactivat din settings."""
+    global _cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def llm_cache_metrics() -> dict:
+    c = get_llm_cache()
+    return c.stats_snapshot() if c is not None else {"enabled": False}
@@ -0,0 +1,123 @@
+# ollama_client.py
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+from log import section, kv
+from ollama_pool import OllamaPool, Endpoint, get_ollama_pool
+
+# câmpurile de durată (nanosecunde) din răspunsul final Ollama
+_DURATIONS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+
+class OllamaClient:
+    """
+    Transportul HTTP către Ollama: o sesiune cu pool de conexiuni (keep-alive TCP)
+    pentru toate endpoint-urile și `keep_alive` trimis la fiecare request, ca modelul
+    să rămână în memorie între anunțuri. Ține separat timpul de încărcare a modelului
+    (load_duration) de timpul de generare, per model.
+    """
+
+    def __init__(self, pool: OllamaPool | None = None, keep_alive: str | None = None):
+        self.pool = pool or get_ollama_pool()
+        self.keep_alive = keep_alive or settings.OLLAMA_KEEP_ALIVE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.pool.endpoints)),
+                              pool_maxsize=max(4, self.pool.capacity() * 2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.timings: dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def post_generate(self, ep: Endpoint, payload: dict, stream: bool, timeout) -> requests.Response:
+        return self.session.post(f"{ep.url}/api/generate", json={**payload, "keep_alive": self.keep_alive},
+                                 stream=stream, timeout=timeout)
+
+    def record(self, model: str, final: dict, warmup: bool = False):
+        """Duratele din ultimul obiect al răspunsului (done=True)."""
+        with self._lock:
+            t = self.timings[model]
+            t["warmups" if warmup else "calls"] += 1
+            for k in _DURATIONS:
+                t[k] += int(final.get(k) or 0)
+
+    def record_early_stop(self, model: str):
+        """Stream închis de client (răspuns complet): nu există obiect final cu durate."""
+        with self._lock:
+            t = self.timings[model]
+            t["calls"] += 1
+            t["early_stops"] += 1
+
+    def warm_endpoint(self, ep: Endpoint, model: str) -> float | None:
+        """Request fără prompt: Ollama doar încarcă modelul. Întoarce load_duration (s)."""
+        timeout = (settings.OLLAMA_TIMEOUT_CONNECT, settings.OLLAMA_TIMEOUT_READ)
+        try:
+            r = self.post_generate(ep, {"model": model, "stream": False}, stream=False, timeout=timeout)
+            r.raise_for_status()
+            final = r.json()
+        except (requests.RequestException, ValueError) as e:
+            section("OLLAMA WARMUP ERROR")
+            kv("endpoint", ep.url)
+            kv("model", model)
+            kv("error", str(e))
+            return None
+        self.record(model, final, warmup=True)
+        self.pool.mark_resident(ep, model)
+        return (final.get("load_duration") or 0) / 1e9
+
+    def warm_up(self, models: list[str]) -> dict[str, float | None]:
+        """
+        Încarcă modelele în paralel pe toate endpoint-urile sănătoase care le au.
+        Întoarce {"model@endpoint": secunde de încărcare (None = eșec)}.
+        """
+        self.pool.refresh()
+        jobs = [(ep, m) for m in dict.fromkeys(x for x in models if x)
+                for ep in self.pool.endpoints if ep.healthy and ep.has_model(m)]
+        if not jobs:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+            loads = list(ex.map(lambda job: self.warm_endpoint(*job), jobs))
+        return {f"{m}@{ep.url}": s for (ep, m), s in zip(jobs, loads)}
+
+    def warm_up_async(self, models: list[str]) -> threading.Thread:
+        """Warm-up în fundal (de ex. cât se încarcă prima pagină de căutare)."""
+        t = threading.Thread(target=self.warm_up, args=(list(models),), daemon=True)
+        t.start()
+        return t
+
+    def timings_snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {m: dict(t) for m, t in self.timings.items()}
+
+    def metrics(self) -> dict:
+        out = {}
+        for m, t in self.timings_snapshot().items():
+            out[m] = {
+                "calls": t.get("calls", 0),
+                "warmups": t.get("warmups", 0),
+                "early_stops": t.get("early_stops", 0),
+                "load_s": round(t.get("load_duration", 0) / 1e9, 2),
+                "generate_s": round((t.get("prompt_eval_duration", 0) + t.get("eval_duration", 0)) / 1e9, 2),
+                "total_s": round(t.get("total_duration", 0) / 1e9, 2),
+            }
+        return out
+
+
+_client: OllamaClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+
+def ollama_client_metrics() -> dict:
+    return get_ollama_client().metrics()
@@ -0,0 +1,203 @@
+# ollama_pool.py
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from config import settings
+
+
+class Endpoint:
+    """Un server Ollama: limita de request-uri simultane, modelele disponibile / încărcate, sănătate."""
+
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.inflight = 0
+        self.available: set[str] | None = None  # /api/tags (None = încă necunoscut)
+        self.resident: set[str] = set()          # /api/ps: modele deja în memorie
+        self.version: tuple[int, ...] | None = None  # /api/version (None = necunoscută)
+        self.healthy = True
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.stats = Counter()
+
+    @property
+    def free(self) -> bool:
+        return self.inflight < self.max_concurrency
+
+    @property
+    def supports_think(self) -> bool:
+        return self.version is not None and self.version >= settings.OLLAMA_THINK_MIN_VERSION
+
+    def has_model(self, model: str) -> bool:
+        # "llama3" == "llama3:latest" pentru Ollama
+        return self.available is None or model in self.available or f"{model}:latest" in self.available
+
+    def metrics(self) -> dict:
+        return {"inflight": self.inflight, "max_concurrency": self.max_concurrency, "healthy": self.healthy,
+                "version": ".".join(map(str, self.version)) if self.version else None,
+                "resident": sorted(self.resident), "available": sorted(self.available or []), **self.stats}
+
+
+def _names(obj: dict) -> set[str]:
+    return {m.get("name") or m.get("model") for m in (obj.get("models") or [])} - {None}
+
+
+def parse_version(raw: str | None) -> tuple[int, ...] | None:
+    """"0.9.6" / "0.11.0-rc1" -> (0, 9, 6) / (0, 11, 0); None dacă nu se poate citi."""
+    nums = []
+    for part in str(raw or "").split("-")[0].split("."):
+        if not part.isdigit():
+            break
+        nums.append(int(part))
+    return tuple(nums) or None
+
+
+class OllamaPool:
+    """
+    Dispatch peste mai multe servere Ollama (settings.OLLAMA_ENDPOINTS):
+    - fiecare request merge la endpoint-ul cel mai puțin încărcat care are deja
+      modelul în memorie (/api/ps); abia apoi la unul care doar îl are (/api/tags)
+    - maxim max_concurrency request-uri pe endpoint (+ limită opțională per model)
+    - health check periodic; un endpoint care cade stă deoparte OLLAMA_ENDPOINT_COOLDOWN_S,
+      iar ollama_generate reîncearcă pe altul (failover)
+    """
+
+    def __init__(self, endpoints: dict[str, int] | None = None):
+        endpoints = endpoints or settings.OLLAMA_ENDPOINTS or {settings.OLLAMA_BASE_URL: 1}
+        self.endpoints = [Endpoint(url, n) for url, n in endpoints.items()]
+        self.model_limits = dict(settings.OLLAMA_MODEL_CONCURRENCY)
+        self.model_inflight = Counter()
+        self._cond = threading.Condition()
+        self._checking: set[str] = set()
+
+    def capacity(self) -> int:
+        return sum(ep.max_concurrency for ep in self.endpoints)
+
+    # ---- health ----
+
+    def check(self, ep: Endpoint) -> bool:
+        timeout = (settings.OLLAMA_TIMEOUT_CONNECT, settings.OLLAMA_HEALTH_TIMEOUT)
+        try:
+            tags = requests.get(f"{ep.url}/api/tags", timeout=timeout)
+            tags.raise_for_status()
+            ps = requests.get(f"{ep.url}/api/ps", timeout=timeout)
+            resident = _names(ps.json()) if ps.status_code == 200 else None
+        except (requests.RequestException, ValueError):
+            with self._cond:
+                self._mark_down(ep)
+                ep.checked_at = time.monotonic()
+            return False
+        try:
+            ver = requests.get(f"{ep.url}/api/version", timeout=timeout)
+            version = parse_version(ver.json().get("version")) if ver.status_code == 200 else None
+        except (requests.RequestException, ValueError):
+            version = None  # necunoscută => tratată ca fără suport pentru "think"
+        with self._cond:
+            ep.available = _names(tags.json())
+            if resident is not None:
+                ep.resident = resident
+            ep.version = version
+            ep.healthy = True
+            ep.checked_at = time.monotonic()
+            self._cond.notify_all()
+        return True
+
+    def _mark_down(self, ep: Endpoint):
+        ep.healthy = False
+        ep.down_until = time.monotonic() + settings.OLLAMA_ENDPOINT_COOLDOWN_S
+        ep.stats["down"] += 1
+
+    def _due_checks(self) -> list[Endpoint]:
+        now = time.monotonic()
+        due = []
+        with self._cond:
+            for ep in self.endpoints:
+                stale = now - ep.checked_at > settings.OLLAMA_HEALTH_INTERVAL_S
+                retry = not ep.healthy and now >= ep.down_until
+                if (stale or retry) and ep.url not in self._checking:
+                    self._checking.add(ep.url)
+                    due.append(ep)
+        return due
+
+    def refresh(self):
+        """Health check pentru endpoint-urile expirate (un singur thread per endpoint)."""
+        for ep in self._due_checks():
+            try:
+                self.check(ep)
+            finally:
+                with self._cond:
+                    self._checking.discard(ep.url)
+
+    # ---- routing ----
+
+    def _pick(self, model: str, cands: list[Endpoint]) -> Endpoint | None:
+        if self.model_inflight[model] >= self.model_limits.get(model, 1 << 30):
+            return None
+        # toate căzute: încercăm totuși pe cel care iese primul din cooldown
+        healthy = [ep for ep in cands if ep.healthy] or [min(cands, key=lambda ep: ep.down_until)]
+        free = [ep for ep in healthy if ep.free]
+        if not free:
+            return None
+        return min(free, key=lambda ep: (model not in ep.resident, ep.inflight / ep.max_concurrency))
+
+    def acquire(self, model: str, exclude: set[str] | None = None, timeout: float | None = None) -> Endpoint:
+        exclude = exclude or set()
+        self.refresh()
+        deadline = time.monotonic() + (timeout if timeout is not None else settings.OLLAMA_TIMEOUT_READ)
+        with self._cond:
+            while True:
+                cands = [ep for ep in self.endpoints if ep.url not in exclude and ep.has_model(model)]
+                if not cands:
+                    raise RuntimeError(f"no Ollama endpoint for model {model}")
+                ep = self._pick(model, cands)
+                if ep is not None:
+                    ep.inflight += 1
+                    ep.stats["requests"] += 1
+                    self.model_inflight[model] += 1
+                    return ep
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise TimeoutError(f"no free Ollama endpoint for model {model}")
+                self._cond.wait(min(left, 1.0))
+
+    def release(self, ep: Endpoint, model: str, ok: bool = True, down: bool = False):
+        """ok: răspuns reușit (modelul e acum în memorie); down: endpoint-ul nu răspunde."""
+        with self._cond:
+            ep.inflight -= 1
+            self.model_inflight[model] -= 1
+            if ok:
+                ep.resident.add(model)
+                ep.healthy = True
+            else:
+                ep.stats["errors"] += 1
+            if down:
+                self._mark_down(ep)
+            self._cond.notify_all()
+
+    def mark_resident(self, ep: Endpoint, model: str):
+        with self._cond:
+            ep.resident.add(model)
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {ep.url: ep.metrics() for ep in self.endpoints}
+
+
+_pool: OllamaPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_ollama_pool() -> OllamaPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool()
+        return _pool
+
+
+def ollama_pool_metrics() -> dict:
+    return get_ollama_pool().metrics()
@@ -0,0 +1,171 @@
+# pipeline.py
+import queue
+import threading
+from typing import Any, Callable
+
+from events import emit
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int, maxsize: int):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers or 1))
+        self.q: queue.Queue = queue.Queue(maxsize=max(1, int(maxsize or 1)))
+        self.busy = 0
+        self.processed = 0
+        self.errors = 0
+        self.next: "Stage | None" = None
+        self._alive = self.workers
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        return {
+            "stage": self.name,
+            "depth": self.q.qsize(),
+            "maxsize": self.q.maxsize,
+            "busy": self.busy,
+            "workers": self.workers,
+            "processed": self.processed,
+            "errors": self.errors,
+        }
+
+
+class Pipeline:
+    """
+    Pipeline pe thread-uri: fiecare stage are N workeri și o coadă de intrare
+    mărginită (backpressure: put() blochează când stage-ul următor e plin).
+
+    fn(item) întoarce item-ul pentru stage-ul următor sau None (drop).
+    Adâncimea cozilor se raportează periodic prin events.emit(run_id, "pipeline", ...).
+    """
+
+    def __init__(self, run_id: str | None = None, on_error: Callable[[str, Any, Exception], None] | None = None,
+                 report_every: float = 1.0):
+        self.run_id = run_id
+        self.on_error = on_error
+        self.report_every = report_every
+        self.stages: list[Stage] = []
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    def stage(self, name: str, fn: Callable[[Any], Any], workers: int = 1, maxsize: int = 8):
+        st = Stage(name, fn, workers, maxsize)
+        if self.stages:
+            self.stages[-1].next = st
+        self.stages.append(st)
+        return self
+
+    # ---- control ----
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self):
+        """Oprește procesarea: workerii golesc cozile fără să mai proceseze."""
+        self._stop.set()
+
+    def start(self):
+        for st in self.stages:
+            for i in range(st.workers):
+                t = threading.Thread(target=self._worker, args=(st,), name=f"pipe-{st.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        if self.run_id and self.report_every:
+            threading.Thread(target=self._reporter, name="pipe-report", daemon=True).start()
+        return self
+
+    def put(self, item) -> bool:
+        """Trimite un item în primul stage. Blochează cât timp coada e plină."""
+        first = self.stages[0]
+        while not self.stopped:
+            try:
+                first.q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def finish(self):
+        """Nu mai vin item-uri noi: așteaptă să se golească toate stage-urile."""
+        first = self.stages[0]
+        for _ in range(first.workers):
+            first.q.put(_DONE)
+        for t in self._threads:
+            t.join()
+        self._finished.set()
+        self._report()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self.stop()
+        self.finish()
+
+    # ---- internals ----
+
+    def _worker(self, st: Stage):
+        while True:
+            item = st.q.get()
+            if item is _DONE:
+                break
+            if self.stopped:
+                continue
+
+            with st._lock:
+                st.busy += 1
+            try:
+                out = st.fn(item)
+            except Exception as e:
+                out = None
+                with st._lock:
+                    st.errors += 1
+                if self.on_error:
+                    try:
+                        self.on_error(st.name, item, e)
+                    except Exception:
+                        pass
+            finally:
+                with st._lock:
+                    st.busy -= 1
+                    st.processed += 1
+
+            if out is not None and st.next is not None:
+                self._forward(st.next, out)
+
+        # ultimul worker al stage-ului închide stage-ul următor
+        with st._lock:
+            st._alive -= 1
+            last = st._alive == 0
+        if last and st.next is not None:
+            for _ in range(st.next.workers):
+                st.next.q.put(_DONE)
+
+    def _forward(self, st: Stage, item):
+        while True:
+            try:
+                st.q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self.stopped:
+                    return
+
+    def snapshot(self) -> list[dict]:
+        return [st.snapshot() for st in self.stages]
+
+    def _report(self):
+        emit(self.run_id, "pipeline", {"stages": self.snapshot()})
+
+    def _reporter(self):
+        last = None
+        while not self._finished.wait(self.report_every):
+            snap = self.snapshot()
+            if snap != last:
+                emit(self.run_id, "pipeline", {"stages": snap})
+                last = snap
@@ -0,0 +1,207 @@
+# profile_runtime.py
+import re
+import json
+from dataclasses import dataclass, field
+
+from db import get_profile
+from keywords import Hit, KeywordMatcher, fold
+from geo import geocode_peek, distance_from_cluj
+
+CFG_RE = re.compile(r"CFG:\s*(\{.*?\})\s*(?=RUBRIC:|$)", flags=re.DOTALL)
+RUBRIC_RE = re.compile(r"RUBRIC:\s*(.*)$", flags=re.DOTALL)
+
+# toleranțe: peste acești factori anunțul e aruncat (sub ei doar penalizat)
+PRICE_HARD_FACTOR = 1.35
+RADIUS_HARD_FACTOR = 1.60
+
+KEYWORD_GROUPS = ("hard_yes", "hard_no", "avoid", "must_have")
+
+
+def parse_profile_cfg(notes: str | None):
+    """
+    Așteaptă în notes:
+    CFG: {...json...}
+    RUBRIC:
+    ...
+    (acceptă și cazul: }RUBRIC: pe aceeași linie)
+    """
+    notes = notes or ""
+    cfg = {"domain": "generic"}
+    rubric = ""
+
+    # ia tot ce e după "CFG:" până la "RUBRIC:" (cu sau fără newline), sau până la final
+    m = CFG_RE.search(notes)
+    if m:
+        raw = m.group(1).strip()
+        try:
+            cfg = json.loads(raw)
+        except Exception:
+            cfg = {"domain": "generic"}
+
+    mr = RUBRIC_RE.search(notes)
+    if mr:
+        rubric = mr.group(1).strip()
+
+    domain = str(cfg.get("domain") or "generic").strip()
+    return cfg, rubric, domain
+
+
+def _cfg_number(cfg: dict, key: str, cast=float):
+    v = cfg.get(key)
+    try:
+        return cast(v) if v is not None else None
+    except Exception:
+        return None
+
+
+@dataclass
+class ProfileRuntime:
+    """
+    Profilul compilat o singură dată per run: CFG + rubric parsate, praguri
+    convertite și frazele hard_yes / hard_no / avoid / must_have într-un singur
+    KeywordMatcher (fără diacritice). Filtrele și scorul per anunț nu mai fac
+    I/O și textul unui anunț e scanat o singură dată pentru toate listele.
+    """
+
+    profile_id: int | None
+    cfg: dict = field(default_factory=lambda: {"domain": "generic"})
+    rubric: str = ""
+    domain: str = "generic"
+    hard_yes: list[str] = field(default_factory=list)
+    hard_no: list[str] = field(default_factory=list)
+    avoid: list[str] = field(default_factory=list)
+    must_have: list[str] = field(default_factory=list)
+    max_price: int | None = None
+    radius_km: float | None = None
+
+    def __post_init__(self):
+        # fraza (folded) -> listele în care apare; "vând" și "vand" devin aceeași frază
+        self.groups: dict[str, set[str]] = {}
+        for group in KEYWORD_GROUPS:
+            for p in getattr(self, group) or []:
+                fp = fold(p).strip()
+                if fp:
+                    self.groups.setdefault(fp, set()).add(group)
+        self.matcher = KeywordMatcher(list(self.groups))
+
+    def keyword_hits(self, text: str, folded: bool = False) -> dict[str, list[Hit]]:
+        """O singură trecere prin text; aparițiile împărțite pe liste (hard_yes, hard_no, ...)."""
+        out: dict[str, list[Hit]] = {g: [] for g in KEYWORD_GROUPS}
+        for h in self.matcher.scan(text, folded):
+            for g in self.groups[h.phrase]:
+                out[g].append(h)
+        return out
+
+    @classmethod
+    def from_profile(cls, prof: dict | None, profile_id: int | None = None) -> "ProfileRuntime":
+        prof = prof or {}
+        cfg, rubric, domain = parse_profile_cfg(prof.get("notes", ""))
+        return cls(
+            profile_id=prof.get("id", profile_id),
+            cfg=cfg,
+            rubric=rubric,
+            domain=domain,
+            hard_yes=prof.get("hard_yes") or [],
+            hard_no=prof.get("hard_no") or [],
+            avoid=cfg.get("avoid") or [],
+            must_have=cfg.get("must_have") or [],
+            max_price=_cfg_number(cfg, "max_price_ron", int),
+            radius_km=_cfg_number(cfg, "radius_km"),
+        )
+
+    @classmethod
+    def load(cls, profile_id: int | None) -> "ProfileRuntime":
+        prof = get_profile(profile_id) if profile_id is not None else None
+        return cls.from_profile(prof, profile_id)
+
+    # ---- scor / filtre per anunț ----
+
+    def keyword_score(self, text: str, hits: dict[str, list[Hit]] | None = None) -> float:
+        # fiecare frază contează o dată, oricâte apariții are
+        hits = hits if hits is not None else self.keyword_hits(text)
+        n_yes = len({h.phrase for h in hits["hard_yes"]})
+        n_no = len({h.phrase for h in hits["hard_no"]})
+        return 1.5 * n_yes - 4.0 * n_no
+
+    def cfg_filters(self, title: str, desc: str, price: int | None, dist_km: float | None,
+                    hits: dict[str, list[Hit]] | None = None) -> dict:
+        """
+        - avoid: HARD (drop)
+        - max_price/radius: soft cu toleranță, hard drop doar dacă e MULT peste
+        - must_have: SOFT (bonus dacă apare, mic penalty dacă lipsește)
+
+        `hits` = keyword_hits(title + "\n" + desc) deja calculat (altfel se scanează aici).
+        """
+        if hits is None:
+            hits = self.keyword_hits((title or "") + "\n" + (desc or ""))
+
+        # 1) HARD negatives (avoid)
+        if hits["avoid"]:
+            return {"drop": True, "reason": f"cfg_avoid:{hits['avoid'][0].phrase}", "bonus": 0.0}
+
+        bonus = 0.0
+
+        # 2) price soft/hard
+        max_price = self.max_price
+        if max_price and price:
+            # wiggle room: peste +35% drop (tune PRICE_HARD_FACTOR)
+            if price > max_price * PRICE_HARD_FACTOR:
+                return {"drop": True, "reason": "over_budget_hard", "bonus": 0.0}
+            if price > max_price:
+                # penalty gradual, max ~ -2.0
+                ratio = (price - max_price) / max_price
+                bonus -= min(2.0, ratio * 10.0)  # 10% peste => -1.0
+            else:
+                bonus += 0.4  # sub buget = mic bonus
+
+        # 3) radius soft/hard (doar dacă ai distanță)
+        radius = self.radius_km
+        if radius and dist_km:
+            if dist_km > radius * RADIUS_HARD_FACTOR:
+                return {"drop": True, "reason": "over_radius_hard", "bonus": 0.0}
+            if dist_km > radius:
+                ratio = (dist_km - radius) / radius
+                bonus -= min(1.5, ratio * 5.0)  # 20% peste => -1.0
+            else:
+                bonus += 0.3
+
+        # 4) must_have: SOFT
+        if self.must_have:
+            if hits["must_have"]:
+                bonus += 0.8
+            else:
+                bonus -= 0.4  # nu omori anunțul, doar îl împingi în jos
+
+        return {"drop": False, "reason": None, "bonus": bonus}
+
+    def card_drop(self, card: dict) -> str | None:
+        """
+        Drop-uri deterministe pe cardul din rezultatele căutării (titlu, preț, oraș),
+        înainte de page load și LLM. Întoarce motivul sau None.
+        """
+        title = card.get("title") or ""
+        if title and self.matcher:
+            hits = self.keyword_hits(title)
+            if hits["hard_no"]:
+                return f"hard_no:{hits['hard_no'][0].phrase}"
+            if hits["avoid"]:
+                return f"cfg_avoid:{hits['avoid'][0].phrase}"
+
+        price = card.get("price")
+        if self.max_price and price and price > self.max_price * PRICE_HARD_FACTOR:
+            return "over_budget_hard"
+
+        loc = card.get("location")
+        if self.radius_km and loc:
+            # fără să blocăm feeder-ul pe Nominatim: orașele încă negeocodate trec mai
+            # departe (distanța se verifică oricum pe pagina anunțului)
+            coords = geocode_peek(loc.split("-")[0].strip() + ", Romania")
+            dist = distance_from_cluj(*coords) if coords else None
+            if dist and dist > self.radius_km * RADIUS_HARD_FACTOR:
+                return "over_radius_hard"
+
+        return None
+
+
+def keyword_score(text: str, hard_yes: list[str], hard_no: list[str]) -> float:
+    return ProfileRuntime(None, hard_yes=hard_yes or [], hard_no=hard_no or []).keyword_score(text)
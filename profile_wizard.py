@@ -1,7 +1,7 @@
 # profile_wizard.py
 import json
-import re
 from analyze import ollama_generate
+from jsonstream import parse_json
 
 _DEFAULT_QUESTIONS = [
     {"id": "q1", "q": "Ce vrei să găsească agentul? (ex: cabane de închiriat, TV-uri defecte reparabile, teren intravilan etc.)", "type": "text"},
@@ -14,41 +14,6 @@ _DEFAULT_QUESTIONS = [
     {"id": "q8", "q": "Detalii extra utile (brand, model, dimensiune, facilități etc.) (sau gol)", "type": "text"},
 ]
 
-def _strip_fences(s: str) -> str:
-    s = s.strip()
-    # scoate ```json ... ``` sau ``` ... ```
-    s = re.sub(r"^\s*```(?:json)?\s*", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"\s*```\s*$", "", s)
-    return s.strip()
-
-def _extract_json_object(s: str) -> str | None:
-    # încearcă să scoată un obiect JSON dintr-un text mai lung
-    start = s.find("{")
-    end = s.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        return s[start:end + 1]
-    return None
-
-def _safe_json_loads(resp: str) -> dict | None:
-    if not resp or not resp.strip():
-        return None
-    t = _strip_fences(resp)
-
-    # 1) direct
-    try:
-        return json.loads(t)
-    except Exception:
-        pass
-
-    # 2) încearcă să extragi doar obiectul JSON din text
-    candidate = _extract_json_object(t)
-    if candidate:
-        try:
-            return json.loads(candidate)
-        except Exception:
-            return None
-    return None
-
 def wizard_generate_questions(model: str, goal: str):
     prompt = f"""
 Ești un expert în căutări OLX și construiești un wizard de întrebări pentru a înțelege exact ce vrea utilizatorul.
@@ -79,7 +44,7 @@ Doar JSON.
 
     wizard_model = "qwen2.5:7b"
     resp = ollama_generate(wizard_model, prompt, label="WIZARD_Q")
-    data = _safe_json_loads(resp)
+    data = parse_json(resp)
 
     qs = (data or {}).get("questions")
     if not isinstance(qs, list) or len(qs) < 2:
@@ -152,7 +117,7 @@ Doar JSON.
 """.strip()
 
     resp = ollama_generate(model, prompt, label="WIZARD_PROFILE")
-    data = _safe_json_loads(resp)
+    data = parse_json(resp)
 
     if not data:
         return {
@@ -0,0 +1,168 @@
+# ratelimit.py
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import settings
+
+# status-uri după care încetinim puternic (serverul ne cere explicit)
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostLimiter:
+    """
+    Token bucket pentru un host, cu rată adaptivă (AIMD):
+    - fiecare răspuns OK crește rata puțin (până la max_rate)
+    - 429/503 o înjumătățesc și pun o pauză (Retry-After dacă există)
+    - alte 5xx, timeout-uri și pagini lente o scad mai blând (până la min_rate)
+
+    reserve() ia un token sub lock și întoarce cât trebuie așteptat, deci același
+    obiect merge din thread-uri (acquire) și din event loop (aacquire).
+    """
+
+    def __init__(self, host: str, rate: float, burst: float, min_rate: float, max_rate: float,
+                 slow_s: float | None = None):
+        self.host = host
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_s = slow_s
+        self.tokens = self.burst
+        self._last = time.monotonic()
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "waits": 0, "wait_s": 0.0, "max_wait_s": 0.0,
+                      "backoffs": 0, "errors": 0, "last_status": None}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self._pause_until - now)
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["waits"] += 1
+                self.stats["wait_s"] += wait
+                self.stats["max_wait_s"] = max(self.stats["max_wait_s"], wait)
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _slow_down(self, factor: float, pause_s: float = 0.0):
+        self.rate = max(self.min_rate, self.rate * factor)
+        if pause_s > 0:
+            self._pause_until = max(self._pause_until, time.monotonic() + pause_s)
+        self.stats["backoffs"] += 1
+
+    def report(self, status: int | None = None, error: bool = False, elapsed: float | None = None,
+               retry_after: float | None = None):
+        """Feedback după request: status HTTP, eroare (timeout / conexiune) și durata."""
+        with self._lock:
+            self.stats["last_status"] = status
+            if error:
+                self.stats["errors"] += 1
+                self._slow_down(0.7, 1.0 / self.rate)
+            elif status in THROTTLE_STATUSES:
+                self._slow_down(0.5, retry_after if retry_after is not None else 2.0 / self.rate)
+            elif status is not None and status >= 500:
+                self._slow_down(0.7)
+            elif self.slow_s and elapsed is not None and elapsed > self.slow_s:
+                self._slow_down(0.85)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20.0)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"rate": round(self.rate, 3), "min_rate": self.min_rate, "max_rate": self.max_rate,
+                    **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.stats.items()}}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None  # formatul cu dată HTTP nu-l folosim
+
+
+class RateLimiter:
+    """
+    Limitatoare per host, din settings.RATE_LIMITS (potrivire pe sufix:
+    "olx.ro" acoperă www.olx.ro) + host-urile Ollama. Host-urile necunoscute nu sunt limitate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: dict[str, HostLimiter] = {}
+        self._config = dict(settings.RATE_LIMITS)
+        for ollama_url in [settings.OLLAMA_BASE_URL, *settings.OLLAMA_ENDPOINTS]:
+            ollama_host = urlparse(ollama_url).hostname
+            if ollama_host:
+                self._config.setdefault(ollama_host, settings.OLLAMA_RATE_LIMIT)
+
+    def _key(self, host: str) -> str | None:
+        for key in self._config:
+            if host == key or host.endswith("." + key):
+                return key
+        return None
+
+    def for_url(self, url: str) -> HostLimiter | None:
+        host = (urlparse(url).hostname or "").lower()
+        key = self._key(host)
+        if key is None:
+            return None
+        with self._lock:
+            lim = self._hosts.get(key)
+            if lim is None:
+                rate, burst, min_rate, max_rate, slow_s = self._config[key]
+                lim = self._hosts[key] = HostLimiter(key, rate, burst, min_rate, max_rate, slow_s)
+            return lim
+
+    def acquire(self, url: str) -> HostLimiter | None:
+        lim = self.for_url(url)
+        if lim is not None:
+            lim.acquire()
+        return lim
+
+    async def aacquire(self, url: str) -> HostLimiter | None:
+        lim = self.for_url(url)
+        if lim is not None:
+            await lim.aacquire()
+        return lim
+
+    def metrics(self) -> dict:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: lim.metrics() for host, lim in hosts.items()}
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Limitatorul partajat al procesului (toate run-urile și thread-urile)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def rate_limit_metrics() -> dict:
+    return get_limiter().metrics()
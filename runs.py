@@ -0,0 +1,157 @@
+# runs.py
+import threading
+import uuid
+
+from db import (
+    get_profile, create_run_row, get_run, set_run_status,
+    done_queries, mark_query_done, done_pages, mark_page_done, set_run_items, get_run_items,
+)
+from events import emit
+from log import section, kv
+from profile_runtime import ProfileRuntime
+from scrape import scrape, judge_phase, LiveLog
+
+# stări finale ale unui URL: la resume nu se mai reiau
+FINAL_STAGES = ("prefiltered", "dropped", "saved")
+
+
+class RunCheckpoint:
+    """
+    Starea persistentă (SQLite) a unui query dintr-un run: pagini terminate și
+    rezultatul fiecărui URL. scrape() o actualizează pe parcurs; la resume,
+    paginile terminate se sar, iar URL-urile rămase 'queued' / 'error' se reiau.
+    """
+
+    def __init__(self, run_id: str, query: str, cancel: threading.Event | None = None):
+        self.run_id = run_id
+        self.query = query
+        self.cancel = cancel or threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel.is_set()
+
+    def pages_done(self) -> set[int]:
+        return done_pages(self.run_id, self.query)
+
+    def page_done(self, page: int):
+        mark_page_done(self.run_id, self.query, page)
+
+    def pending_urls(self) -> list[str]:
+        return [u for u, st in get_run_items(self.run_id, self.query).items() if st not in FINAL_STAGES]
+
+    def saved_count(self) -> int:
+        return sum(1 for st in get_run_items(self.run_id, self.query).values() if st == "saved")
+
+    def judging_count(self) -> int:
+        """Salvate doar cu minimal: faza de judge n-a ajuns la ele sau a eșuat."""
+        return sum(1 for st in get_run_items(self.run_id, self.query).values() if st == "judging")
+
+    def mark(self, urls: list[str] | str, stage: str, reason: str | None = None):
+        set_run_items(self.run_id, self.query, [urls] if isinstance(urls, str) else list(urls), stage, reason)
+
+
+_cancel: dict[str, threading.Event] = {}
+_cancel_lock = threading.Lock()
+
+
+def new_run(profile_id: int | None, model: str, queries: list[str], pages: int | None = None,
+            max_ads: int | None = None, fetch_mode: str | None = None, run_id: str | None = None,
+            snapshots: bool | None = None) -> str:
+    run_id = run_id or uuid.uuid4().hex
+    create_run_row(run_id, profile_id, model, {
+        "queries": list(queries), "pages": pages, "max_ads": max_ads, "fetch_mode": fetch_mode,
+        "snapshots": snapshots,
+    })
+    return run_id
+
+
+def cancel_run(run_id: str) -> bool:
+    with _cancel_lock:
+        ev = _cancel.get(run_id)
+    if ev is None:
+        return False
+    ev.set()
+    return True
+
+
+def is_active(run_id: str) -> bool:
+    with _cancel_lock:
+        return run_id in _cancel
+
+
+def execute_run(run_id: str, emit_events: bool = True) -> int:
+    """
+    Rulează (sau reia) run-ul salvat: query-urile terminate se sar, restul
+    continuă din checkpoint. Întoarce câte anunțuri s-au colectat acum.
+    """
+    run = get_run(run_id)
+    if run is None:
+        raise ValueError(f"unknown run {run_id}")
+    params = run["params"]
+    profile_id = run["profile_id"]
+    prof = get_profile(profile_id) if profile_id is not None else None
+    rt = ProfileRuntime.from_profile(prof, profile_id)
+
+    cancel = threading.Event()
+    with _cancel_lock:
+        if run_id in _cancel:
+            raise RuntimeError(f"run {run_id} is already active")
+        _cancel[run_id] = cancel
+
+    live_id = run_id if emit_events else None
+    set_run_status(run_id, "running")
+    finished = done_queries(run_id)
+    # URL-urile deja înregistrate în run (orice query) nu se mai iau a doua oară
+    seen = set(get_run_items(run_id))
+    if finished:
+        emit(live_id, "section", {"title": "RESUME"})
+        emit(live_id, "kv", {"key": "queries_done", "value": f"{len(finished)}/{len(params['queries'])}"})
+
+    total = 0
+    # settings.LLM_PHASED: judge-ul verbose rulează o singură dată, după toate query-urile;
+    # un query cu anunțuri amânate e terminat abia când toate au trecut de faza de judge
+    # (altfel resume l-ar sări și ele ar rămâne 'judging' pentru totdeauna)
+    deferred: list[dict] = []
+    waiting: list[RunCheckpoint] = []
+    try:
+        for q in params["queries"]:
+            if q in finished:
+                continue
+            if cancel.is_set():
+                break
+            cp = RunCheckpoint(run_id, q, cancel)
+            before = len(deferred)
+            n = scrape(query=q, model=run["model"], profile_id=profile_id, max_pages=params.get("pages"),
+                       max_ads=params.get("max_ads"), run_id=live_id, fetch_mode=params.get("fetch_mode"),
+                       seen_urls=seen, runtime=rt, checkpoint=cp, snapshots=params.get("snapshots"),
+                       deferred=deferred)
+            total += n
+            if cancel.is_set():
+                break
+            if len(deferred) > before:
+                waiting.append(cp)
+            else:
+                mark_query_done(run_id, q, cp.saved_count())
+        if deferred:
+            judge_phase(deferred, LiveLog(live_id))
+        for cp in waiting:
+            if not cancel.is_set() and cp.judging_count() == 0:
+                mark_query_done(run_id, cp.query, cp.saved_count())
+    except Exception as e:
+        set_run_status(run_id, "failed", str(e))
+        section("RUN FAILED")
+        kv("error", str(e))
+        raise
+    else:
+        if cancel.is_set():
+            status = "cancelled"
+        elif set(params["queries"]) <= done_queries(run_id):
+            status = "done"
+        else:
+            status = "interrupted"  # ex. judge eșuat pentru unele anunțuri: resume le reia
+        set_run_status(run_id, status)
+    finally:
+        with _cancel_lock:
+            _cancel.pop(run_id, None)
+    return total
@@ -1,529 +1,860 @@
-import re
 import json
-import time
-from datetime import datetime
-from urllib.parse import urljoin
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlencode
 from log import section, kv, block, trunc, enabled
 
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-
 from config import settings
-from db import init_db, upsert_ad, get_profile
-from analyze import analyze_ad, classify_intent
-from geo import geocode_nominatim, distance_from_cluj
+from db import (
+    init_db, upsert_ad, get_seen_ads, get_watch_state, save_watch_state, get_watch_seen, add_watch_seen,
+    save_ad_intent,
+)
+from analyze import analyze_ad, analyze_intent_minimal, classify_intent, judge_verbose
+from geo import geocode_cached, distance_from_cluj
+from browser import get_browser
+from fetch import HttpFetcher, FETCH_MODES
+from extract import AdDocument, SearchPage, extract_stats
+from extract import parse_price_ron, normalize_city, extract_coords_from_next  # noqa: F401 (compat)
+from pipeline import Pipeline
+from intent_local import get_intent_classifier
+from ollama_pool import get_ollama_pool
+from ollama_client import get_ollama_client
+from ratelimit import rate_limit_metrics
+from snapshots import get_snapshot_store, ReplaySession
+from profile_runtime import ProfileRuntime, keyword_score, parse_profile_cfg  # noqa: F401 (compat)
 
 from events import emit
 
-PRICE_RE = re.compile(r"(\d[\d\.\s]*)")
+# --- compat: extractoarele vechi, acum wrappers peste AdDocument (un singur parse) ---
 
-def keyword_score(text: str, hard_yes: list[str], hard_no: list[str]) -> float:
-    t = (text or "").lower()
-    score = 0.0
+def extract_next_data(html: str):
+    return AdDocument(html).next_data
 
-    for k in (hard_yes or []):
-        kk = (k or "").lower().strip()
-        if kk and kk in t:
-            score += 1.5
+def extract_image_from_html(html: str):
+    return AdDocument(html).image
+
+def extract_title_desc_location_price(html: str):
+    doc = AdDocument(html)
+    return {"title": doc.title, "desc": doc.desc, "price": doc.price}
 
-    for k in (hard_no or []):
-        kk = (k or "").lower().strip()
-        if kk and kk in t:
-            score -= 4.0
+def extract_location_from_html(html: str):
+    return AdDocument(html).location
 
-    return score
+def extract_distance_from_html(html: str):
+    return AdDocument(html).distance_km
 
-def parse_profile_cfg(notes: str | None):
+def known_fresh_urls(urls: list[str], ttl_hours: float | None = None) -> set[str]:
     """
-    Așteaptă în notes:
-    CFG: {...json...}
-    RUBRIC:
-    ...
-    (acceptă și cazul: }RUBRIC: pe aceeași linie)
+    URL-urile care sunt deja în DB și au fost analizate în ultimele ttl_hours ore.
+    Acestea nu mai merită un page load + apeluri LLM.
     """
-    notes = notes or ""
-    cfg = {"domain": "generic"}
-    rubric = ""
-
-    # ia tot ce e după "CFG:" până la "RUBRIC:" (cu sau fără newline), sau până la final
-    m = re.search(r"CFG:\s*(\{.*?\})\s*(?=RUBRIC:|$)", notes, flags=re.DOTALL)
-    if m:
-        raw = m.group(1).strip()
+    ttl_hours = settings.SEEN_AD_TTL_HOURS if ttl_hours is None else ttl_hours
+    if not urls or not ttl_hours or ttl_hours <= 0:
+        return set()
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ttl_hours)
+    fresh = set()
+    for url, scraped_at in get_seen_ads(urls).items():
         try:
-            cfg = json.loads(raw)
+            ts = datetime.fromisoformat(scraped_at)
         except Exception:
-            cfg = {"domain": "generic"}
+            continue  # timestamp lipsă / stricat => tratăm ca stale
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if ts >= cutoff:
+            fresh.add(url)
+    return fresh
+
+def search_page_url(query: str, page: int = 1, newest: bool = False) -> str:
+    url = f"{settings.OLX_BASE}/oferte/q-{query}/"
+    params = []
+    if newest:
+        params.append(("search[order]", "created_at:desc"))
+    if page > 1:
+        params.append(("page", page))
+    return f"{url}?{urlencode(params, safe='[]:')}" if params else url
+
+def watch_new_cards(cards: list[dict], known: set[str], stop_after: int) -> tuple[list[dict], bool]:
+    """
+    Rezultate newest-first: cardurile noi până la primul șir de `stop_after`
+    URL-uri deja văzute, consecutive (de acolo în jos totul e mai vechi).
+    Anunțurile promovate din capul listei sunt văzute, dar izolate, deci nu opresc.
+    Întoarce (carduri noi, am ajuns la anunțuri vechi).
+    """
+    new, streak = [], 0
+    for c in cards:
+        if c["url"] in known:
+            streak += 1
+            if streak >= stop_after:
+                return new, True
+        else:
+            streak = 0
+            new.append(c)
+    return new, False
+
+class LiveLog:
+    """Log în consolă + emit către UI (SSE) pentru un run."""
+
+    def __init__(self, run_id: str | None):
+        self.run_id = run_id
+
+    def section(self, title: str):
+        section(title)
+        emit(self.run_id, "section", {"title": title})
 
-    mr = re.search(r"RUBRIC:\s*(.*)$", notes, flags=re.DOTALL)
-    if mr:
-        rubric = mr.group(1).strip()
+    def kv(self, k: str, v):
+        kv(k, v)
+        emit(self.run_id, "kv", {"key": k, "value": v})
 
-    domain = str(cfg.get("domain") or "generic").strip()
-    return cfg, rubric, domain
+    def block(self, lbl: str, content: str):
+        block(lbl, content)
+        emit(self.run_id, "block", {"label": lbl, "content": content})
 
+    def stream_cb(self, label: str, kind: str, payload: dict):
+        # ✅ probe: apare în Log, deci sigur vine din LLM
+        emit(self.run_id, "kv", {"key": f"LLM:{label}", "value": kind})
+        emit(self.run_id, "llm", {"label": label, "kind": kind, **payload})
+
+
+def parse_ad(url: str, ad_html: str, live: LiveLog) -> dict:
+    """Stage PARSE: câmpurile anunțului + geo."""
+    doc = AdDocument(ad_html)
+    title = doc.title
+    desc = doc.desc
+    price = doc.price
+    loc = doc.location
+    img = doc.image
+
+    live.section("AD FOUND")
+    live.kv("url", url)
+    live.kv("title", title)
+    live.kv("price_ron", price)
+    live.kv("location", loc)
+    if doc.fallbacks:
+        live.kv("dom_fallback", ",".join(doc.fallbacks))
+
+    if enabled("AGENT_LOG_DESC"):
+        live.block("description", trunc(desc or "", 1200))
+
+    lat = lon = None
+    if doc.coords:
+        lat, lon = doc.coords
+
+    if (lat is None or lon is None) and loc:
+        place = loc.split("-")[0].strip()
+        coords = geocode_cached(place + ", Romania")
+        if coords:
+            lat, lon = coords
+
+    dist = doc.distance_km
+    if dist is None:
+        dist = distance_from_cluj(lat, lon)
+
+    live.section("GEO")
+    live.kv("lat", lat)
+    live.kv("lon", lon)
+    live.kv("distance_km", f"{dist:.1f}" if dist else None)
+
+    return {
+        "url": url,
+        "title": title,
+        "desc": desc,
+        "price": price,
+        "loc": loc,
+        "img": img,
+        "lat": lat,
+        "lon": lon,
+        "dist": dist,
+    }
+
+
+def intent_drop_reason(domain: str, intent: str) -> str | None:
+    """Excluderi stricte pe domeniu după intent (rămân hard, nu se salvează)."""
+    if domain == "rentals_cabins" and intent != "RENTAL":
+        return "intent_mismatch_for_rentals"
+    if domain == "electronics_tv_flip" and intent == "OFFER_SERVICE":
+        return "service_ad_excluded"
+    return None
 
-def parse_price_ron(text: str | None):
-    if not text:
-        return None
-    t = text.replace("\xa0", " ").lower()
-    m = PRICE_RE.search(t)
-    if not m:
-        return None
-    digits = m.group(1).replace(".", "").replace(" ", "")
-    try:
-        return int(digits)
-    except Exception:
-        return None
 
-def extract_next_data(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    script = soup.find("script", id="__NEXT_DATA__")
-    if not script or not script.string:
-        return None
-    try:
-        return json.loads(script.string)
-    except Exception:
+# scorul minimal de la care se cere și analiza verbose (judge_model)
+VERBOSE_THRESHOLD = 5.0
+
+
+def apply_verbose(ad: dict, minimal: dict, verbose: dict | None, soft_drop_reason: str | None = None):
+    """Câmpurile verbose (sau None) + judge_error + motivul de soft drop în notes."""
+    if verbose:
+        ad["confidence"] = float(verbose.get("confidence", 0.5))
+        ad["signals_positive"] = json.dumps(verbose.get("signals_positive", []), ensure_ascii=False)
+        ad["signals_negative"] = json.dumps(verbose.get("signals_negative", []), ensure_ascii=False)
+        ad["quick_tests"] = json.dumps(verbose.get("quick_tests", []), ensure_ascii=False)
+        ad["repair_items"] = json.dumps(verbose.get("repair_items", []), ensure_ascii=False)
+        ad["resale_value_low"] = int(verbose.get("resale_value_low", 0) or 0)
+        ad["resale_value_high"] = int(verbose.get("resale_value_high", 0) or 0)
+        ad["profit_low"] = int(verbose.get("profit_low", 0) or 0)
+        ad["profit_high"] = int(verbose.get("profit_high", 0) or 0)
+        n = verbose.get("notes", "")
+        if isinstance(n, (list, dict)):
+            n = json.dumps(n, ensure_ascii=False)
+        ad["notes"] = n
+        ad["drive_time_min"] = None
+    else:
+        ad["confidence"] = None
+        ad["signals_positive"] = None
+        ad["signals_negative"] = None
+        ad["quick_tests"] = None
+        ad["repair_items"] = None
+        ad["resale_value_low"] = None
+        ad["resale_value_high"] = None
+        ad["profit_low"] = None
+        ad["profit_high"] = None
+        ad["drive_time_min"] = None
+        ad["notes"] = ""
+
+    if "judge_error" in minimal:
+        ad["judge_error"] = minimal["judge_error"]
+    else:
+        ad["judge_error"] = None
+
+    if soft_drop_reason:
+        # nu avem coloană “drop_reason” în DB, deci o punem în notes
+        ad["notes"] = (ad.get("notes") or "").strip()
+        ad["notes"] = (ad["notes"] + "\n" + soft_drop_reason).strip()
+
+
+def judge_ad(item: dict, model: str, rt: ProfileRuntime, live: LiveLog,
+             defer_judge: bool = False) -> dict | None:
+    """
+    Stage LLM: intent -> filtre -> minimal -> verbose.
+    Cu settings.LLM_COMBINED_INTENT: filtre -> intent+minimal (un apel) -> verbose.
+    Intent-ul vine întâi din clasificatorul local; LLM-ul doar sub INTENT_LOCAL_MIN_CONF.
+    defer_judge: fără verbose aici; anunțul primește "_judge" pentru faza 2 din scrape().
+    Întoarce rândul pentru DB sau None dacă anunțul e aruncat.
+    """
+    url = item["url"]
+    title = item["title"]
+    desc = item["desc"]
+    price = item["price"]
+    loc = item["loc"]
+    img = item["img"]
+    lat, lon, dist = item["lat"], item["lon"], item["dist"]
+    stream_cb = live.stream_cb
+
+    live.section("ANALYZE")
+    live.kv("url", url)
+
+    domain = rt.domain
+    combined = settings.LLM_COMBINED_INTENT
+    minimal = None
+    clf = get_intent_classifier() if settings.INTENT_LOCAL_ENABLED else None
+
+    def record_llm_intent(intent: str):
+        # etichetele LLM sunt datele de antrenare pentru clasificatorul local
+        save_ad_intent(url, title or "", desc or "", intent, "llm", model=model)
+        if clf is not None:
+            clf.count("llm")
+
+    def check_intent(intent: str) -> bool:
+        live.section("INTENT")
+        live.kv("intent", intent)
+        live.kv("domain", domain)
+        reason = intent_drop_reason(domain, intent)
+        if reason:
+            live.section("DROP")
+            live.kv("reason", reason)
+        return reason is None
+
+    # 1) intent: local dacă e sigur, altfel LLM (în modul combinat LLM-ul vine abia
+    #    după filtrele locale, odată cu minimal)
+    intent = None
+    if clf is not None:
+        guess = clf.classify(title or "", desc or "")
+        live.section("INTENT LOCAL")
+        live.kv("guess", guess.label)
+        live.kv("confidence", round(guess.confidence, 3))
+        live.kv("source", guess.source)
+        if guess.confidence >= settings.INTENT_LOCAL_MIN_CONF:
+            intent = guess.label
+            clf.count("local")
+            save_ad_intent(url, title or "", desc or "", intent, "local", confidence=guess.confidence)
+
+    if intent is None and not combined:
+        intent = classify_intent(model, title or "", desc or "", stream_cb=stream_cb)
+        record_llm_intent(intent)
+    if intent is not None and not check_intent(intent):
         return None
 
-def extract_coords_from_next(next_data: dict):
-    try:
-        props = next_data.get("props", {})
-        page = props.get("pageProps", {})
-        offer = page.get("offer") or page.get("ad") or page.get("data")
-        if isinstance(offer, dict):
-            loc = offer.get("location") or {}
-            coords = loc.get("coordinates")
-            if isinstance(coords, dict):
-                lat = coords.get("latitude") or coords.get("lat")
-                lon = coords.get("longitude") or coords.get("lon")
-                if lat and lon:
-                    return float(lat), float(lon)
-            lat = loc.get("lat") or offer.get("latitude")
-            lon = loc.get("lon") or offer.get("longitude")
-            if lat and lon:
-                return float(lat), float(lon)
-    except Exception:
-        pass
-    return None
-
-def extract_image_from_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    og = soup.find("meta", property="og:image")
-    if og and og.get("content"):
-        return og["content"]
-    img = soup.find("img")
-    return img["src"] if img and img.get("src") else None
+    # 2) keyword bonus
+    # un singur fold + o singură scanare pentru toate listele de fraze din profil
+    hits = rt.keyword_hits((title or "") + "\n" + (desc or ""))
+    kb = rt.keyword_score("", hits=hits)
+    live.section("KEYWORD SCORE")
+    live.kv("keyword_bonus", kb)
+    for group, group_hits in hits.items():
+        if group_hits:
+            live.kv(group, ", ".join(f"{h.phrase}@{h.start}" for h in group_hits))
+    cfg_res = rt.cfg_filters(title or "", desc or "", price, dist, hits=hits)
+
+    if cfg_res["drop"]:
+        live.section("DROP")
+        live.kv("reason", cfg_res["reason"])
+        return None
 
-def extract_title_desc_location_price(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    data = {"title": None, "desc": None, "price": None}
-
-    h1 = soup.find("h1")
-    if h1:
-        data["title"] = h1.get_text(strip=True)
-
-    if not data["title"]:
-        ogt = soup.find("meta", property="og:title")
-        if ogt and ogt.get("content"):
-            data["title"] = ogt["content"].strip()
-
-    for sel in [
-        "div[data-cy='ad_description']",
-        "div[data-testid='ad-description']",
-        "div#textContent"
-    ]:
-        node = soup.select_one(sel)
-        if node:
-            data["desc"] = node.get_text("\n", strip=True)
-            break
-
-    meta_price = soup.find("meta", property="product:price:amount")
-    if meta_price and meta_price.get("content"):
+    cfg_bonus = cfg_res["bonus"]
+    live.section("CFG SCORE")
+    live.kv("cfg_bonus", cfg_bonus)
+
+    if intent is None:
+        intent, minimal = analyze_intent_minimal(model, title or "", desc or "", price,
+                                                 domain=domain, stream_cb=stream_cb)
+        record_llm_intent(intent)
+        if not check_intent(intent):
+            return None
+
+    analysis = analyze_ad(
+        model=model,
+        judge_model=None if defer_judge else settings.JUDGE_MODEL,
+        title=title or "",
+        description=desc or "",
+        price_ron=price,
+        verbose_threshold=VERBOSE_THRESHOLD,
+        keyword_bonus=kb + cfg_bonus,
+        domain=domain,
+        stream_cb=stream_cb,
+        minimal=minimal,
+    )
+
+    minimal = analysis["minimal"]
+    verbose = analysis["verbose"]
+
+    # --- Decide save vs soft drop ---
+    save_strict = True
+    if domain == "rentals_cabins":
         try:
-            data["price"] = int(float(meta_price["content"]))
+            score = float(minimal.get("score", 0))
+            scam = float(minimal.get("scam_risk", 10))
         except Exception:
-            pass
-
-    if data["price"] is None:
-        price_node = soup.find(attrs={"data-testid": "ad-price-container"})
-        if price_node:
-            data["price"] = parse_price_ron(price_node.get_text(" ", strip=True))
-
-    return data
-
-def normalize_city(loc: str) -> str:
-    parts = [p.strip() for p in (loc or "").split(",") if p.strip()]
-    if not parts:
-        return ""
-    if len(parts) >= 2:
-        return parts[1]
-    return parts[0]
+            score, scam = 0, 10
+        save_strict = (score >= 7.0 and scam <= 5.0 and minimal.get("verdict") != "NU MERITĂ")
 
-def extract_location_from_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    img = soup.select_one(".qa-static-ad-map-container img[alt]")
-    if img and img.get("alt"):
-        full = img["alt"].strip()
-        city = normalize_city(full)
-        return city or full
-    return None
-
-def extract_distance_from_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
-    d = soup.select_one("[data-testid='distance-field']")
-    if not d:
-        return None
-    txt = d.get_text(strip=True).lower()
-    m = re.search(r"(\d+)\s*km", txt)
-    if m:
-        return float(m.group(1))
-    return None
-
-def scrape(query: str, model: str, profile_id: int, max_pages: int | None = None, max_ads: int | None = None, run_id: str | None = None):
+    elif domain == "electronics_tv_flip":
+        try:
+            score = float(minimal.get("score", 0))
+        except Exception:
+            score = 0
+        verdict = (minimal.get("verdict") or "").upper()
+        save_strict = (score >= 7.0 and verdict in {"MERITĂ", "MERITĂ LA PIESE"})
+
+    # ✅ tu ai zis: să nu mai “dispară” — deci salvăm și soft-drop
+    soft_drop_reason = None
+    if not save_strict:
+        live.section("DROP")
+        live.kv("reason", "not_good_enough_after_analysis")
+        live.kv("score", minimal.get("score"))
+        live.kv("verdict", minimal.get("verdict"))
+        soft_drop_reason = f"[SOFT DROP] not_good_enough_after_analysis | score={minimal.get('score')} | verdict={minimal.get('verdict')}"
+
+    if "judge_error" in minimal:
+        live.section("JUDGE ERROR (fallback to minimal)")
+        live.kv("error", minimal["judge_error"])
+
+    ad = {
+        "profile_id": rt.profile_id,
+        "url": url,
+        "title": title or "",
+        "description": desc or "",
+        "location_text": loc or "",
+        "image_url": img or "",
+        "price_ron": int(price) if price is not None else None,
+        "distance_km": float(dist) if dist is not None else None,
+        "lat": float(lat) if lat is not None else None,
+        "lon": float(lon) if lon is not None else None,
+        "scraped_at": datetime.now(timezone.utc).isoformat(),
+        "snapshot_sha": item.get("snapshot_sha"),
+        "snapshot_at": item.get("snapshot_at"),
+    }
+
+    ad.update({
+        "score": float(minimal.get("score", 5.0)),
+        "verdict": minimal.get("verdict", ""),
+        "likely_fix": minimal.get("likely_fix", ""),
+        "repair_estimate_low": int(minimal.get("repair_estimate_low", 0) or 0),
+        "repair_estimate_high": int(minimal.get("repair_estimate_high", 0) or 0),
+        "parts_suspected": minimal.get("parts_suspected", ""),
+        "reasoning": minimal.get("reasoning_short", ""),
+    })
+
+    # parse_ok heuristic
+    ad["parse_ok"] = 0 if (minimal.get("reasoning_short", "").startswith("Fallback")) else 1
+
+    apply_verbose(ad, minimal, verbose, soft_drop_reason)
+    if defer_judge and minimal.get("score", 0) >= VERBOSE_THRESHOLD:
+        # faza 2 (după ce toate anunțurile au trecut de minimal) face judge-ul verbose
+        ad["_judge"] = {"title": title or "", "description": desc or "", "price_ron": price,
+                        "domain": domain, "minimal": minimal, "soft_drop_reason": soft_drop_reason}
+
+    return ad
+
+
+def judge_phase(ads: list[dict], live: LiveLog, workers: int | None = None):
+    """
+    Faza 2 (settings.LLM_PHASED): judge-ul verbose pentru anunțurile amânate de judge_ad,
+    toate cu JUDGE_MODEL, deci modelul se încarcă o singură dată. Rulează o dată per
+    run (după toate query-urile), nu per query; fiecare anunț își are checkpoint-ul lui.
+    """
+    workers = workers or max(settings.PIPELINE_LLM_WORKERS, get_ollama_pool().capacity())
+    live.section("JUDGE PHASE")
+    live.kv("ads", len(ads))
+    live.kv("judge_model", settings.JUDGE_MODEL)
+
+    def judge_one(ad: dict):
+        j = ad.pop("_judge")
+        checkpoint = j.get("checkpoint")
+        if checkpoint is not None and checkpoint.cancelled:
+            return
+        verbose = judge_verbose(settings.JUDGE_MODEL, j["title"], j["description"], j["price_ron"],
+                                j["minimal"], j["domain"], live.stream_cb)
+        if "judge_error" in j["minimal"]:
+            live.section("JUDGE ERROR (fallback to minimal)")
+            live.kv("url", ad["url"])
+            live.kv("error", j["minimal"]["judge_error"])
+        apply_verbose(ad, j["minimal"], verbose, j["soft_drop_reason"])
+        upsert_ad(ad)
+        if checkpoint is not None:
+            checkpoint.mark(ad["url"], "saved")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for fut in [ex.submit(judge_one, ad) for ad in ads]:
+            try:
+                fut.result()
+            except Exception as e:
+                live.section("JUDGE PHASE ERROR")
+                live.kv("error", trunc(str(e), 300))
+
+
+def scrape(query: str, model: str, profile_id: int, max_pages: int | None = None, max_ads: int | None = None, run_id: str | None = None,
+           fetch_mode: str | None = None, seen_urls: set[str] | None = None, runtime: ProfileRuntime | None = None,
+           watch: bool = False, checkpoint=None, snapshots: bool | None = None,
+           deferred: list[dict] | None = None):
+    """
+    Pipeline pe etape, legate prin cozi mărginite:
+      crawl (pagini de căutare) -> fetch (N pagini) -> parse -> LLM -> DB writer
+    Browserul încarcă anunțurile următoare cât timp LLM-ul se gândește la cel curent.
+
+    seen_urls: set partajat de toate query-urile unui run (URL-uri canonice);
+    un anunț găsit de mai multe query-uri e procesat o singură dată.
+    runtime: profilul compilat o dată per run (altfel se compilează aici).
+    watch: pass incremental — rezultate newest-first, paginare oprită la primul șir
+    de anunțuri deja văzute (DB / pass-uri anterioare), high-water mark salvat per query.
+    checkpoint: runs.RunCheckpoint — paginile terminate și rezultatul fiecărui URL se
+    scriu în SQLite; la resume paginile terminate se sar și URL-urile neterminate se reiau.
+    snapshots: salvează HTML-ul paginilor în snapshot store (implicit settings.SNAPSHOTS_ENABLED);
+    fetch_mode="replay" citește paginile de acolo, fără rețea, și re-analizează și
+    anunțurile proaspete (SEEN_AD_TTL_HOURS nu se aplică).
+    deferred: listă partajată de query-urile unui run (settings.LLM_PHASED); anunțurile
+    pentru judge se adaugă aici, iar apelantul rulează judge_phase o singură dată la
+    final. Fără ea, faza de judge rulează la sfârșitul acestui query.
+    """
     init_db()
-    max_pages = max_pages or settings.MAX_PAGES
-    search_url = f"{settings.OLX_BASE}/oferte/q-{query}/"
-    collected = 0
-
-    # --- LIVE wrappers (log + emit) ---
-    def live_section(title: str):
-        section(title)
-        emit(run_id, "section", {"title": title})
-
-    def live_kv(k: str, v):
-        kv(k, v)
-        emit(run_id, "kv", {"key": k, "value": v})
-
-    def live_block(lbl: str, content: str):
-        block(lbl, content)
-        emit(run_id, "block", {"label": lbl, "content": content})
-
-    def stream_cb(label: str, kind: str, payload: dict):
-        # ✅ probe: apare în Log, deci sigur vine din LLM
-        emit(run_id, "kv", {"key": f"LLM:{label}", "value": kind})
-        emit(run_id, "llm", {"label": label, "kind": kind, **payload})
+    max_pages = max_pages or (settings.WATCH_MAX_PAGES if watch else settings.MAX_PAGES)
+    search_url = search_page_url(query, newest=watch)
+    limit_ads = max_ads or settings.MAX_ADS_PER_RUN
+    live = LiveLog(run_id)
+    seen_urls = set() if seen_urls is None else seen_urls
+    own_phase = deferred is None
+    deferred = [] if deferred is None else deferred
+    fetch_mode = fetch_mode or settings.FETCH_MODE
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"fetch_mode must be one of {FETCH_MODES}, got {fetch_mode!r}")
 
     emit(run_id, "section", {"title": "SEARCH"})
     emit(run_id, "kv", {"key": "query", "value": query})
     emit(run_id, "kv", {"key": "model", "value": model})
     emit(run_id, "kv", {"key": "max_pages", "value": max_pages})
-    emit(run_id, "kv", {"key": "max_ads", "value": (max_ads or settings.MAX_ADS_PER_RUN)})
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(user_agent=settings.USER_AGENT)
-        page = context.new_page()
-
-        page.goto(search_url, wait_until="domcontentloaded")
-
-        for _ in range(max_pages):
-            html = page.content()
-            soup = BeautifulSoup(html, "html.parser")
-
-            links = []
-            for a in soup.find_all("a", href=True):
-                href = a["href"]
-                if "/d/oferta/" in href or "/oferta/" in href:
-                    full = href if href.startswith("http") else urljoin(settings.OLX_BASE, href)
-                    if full not in links:
-                        links.append(full)
-
-            for url in links:
-                limit_ads = max_ads or settings.MAX_ADS_PER_RUN
-                if collected >= limit_ads:
-                    break
-
-                ad_page = context.new_page()
-                try:
-                    ad_page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                    ad_html = ad_page.content()
-
-                    parsed = extract_title_desc_location_price(ad_html)
-                    title = parsed["title"]
-                    desc = parsed["desc"]
-                    price = parsed["price"]
-                    loc = extract_location_from_html(ad_html)
-                    img = extract_image_from_html(ad_html)
-
-                    live_section("AD FOUND")
-                    live_kv("url", url)
-                    live_kv("title", title)
-                    live_kv("price_ron", price)
-                    live_kv("location", loc)
-
-                    if enabled("AGENT_LOG_DESC"):
-                        live_block("description", trunc(desc or "", 1200))
-
-                    next_data = extract_next_data(ad_html)
-                    lat = lon = None
-                    if next_data:
-                        coords = extract_coords_from_next(next_data)
-                        if coords:
-                            lat, lon = coords
-
-                    if (lat is None or lon is None) and loc:
-                        place = loc.split("-")[0].strip()
-                        coords = geocode_nominatim(place + ", Romania")
-                        if coords:
-                            lat, lon = coords
-
-                    dist = extract_distance_from_html(ad_html)
-                    if dist is None:
-                        dist = distance_from_cluj(lat, lon)
-
-                    live_section("GEO")
-                    live_kv("lat", lat)
-                    live_kv("lon", lon)
-                    live_kv("distance_km", f"{dist:.1f}" if dist else None)
-
-                    prof = get_profile(profile_id)
-                    hard_yes = prof.get("hard_yes", []) if prof else []
-                    hard_no = prof.get("hard_no", []) if prof else []
-                    notes = prof.get("notes", "") if prof else ""
-
-                    cfg, rubric, domain = parse_profile_cfg(notes)
-
-                    def norm(s: str) -> str:
-                        return (s or "").lower()
-
-                    def contains_any(text: str, phrases: list[str]) -> str | None:
-                        t = norm(text)
-                        for p in phrases or []:
-                            pp = norm(p).strip()
-                            if pp and pp in t:
-                                return pp
+    emit(run_id, "kv", {"key": "max_ads", "value": limit_ads})
+    emit(run_id, "kv", {"key": "fetch_mode", "value": fetch_mode})
+    if watch:
+        emit(run_id, "kv", {"key": "watch", "value": True})
+
+    watch_state = get_watch_state(profile_id, query) if watch else None
+    head_urls = set(watch_state["head_urls"]) if watch_state else set()
+    head: list[str] = []    # capul listei din acest pass => noul high-water mark
+    new_in_pass = 0
+
+    stats_before = extract_stats()
+    record = settings.SNAPSHOTS_ENABLED if snapshots is None else snapshots
+    store = get_snapshot_store() if (record or fetch_mode == "replay") else None
+    record = record and fetch_mode != "replay"
+    snap_before = store.stats_snapshot() if store is not None else {}
+
+    def snap(url: str, html: str) -> tuple[str | None, str | None]:
+        return store.put(url, html) if record else (None, None)
+    prefiltered = 0
+
+    # modelele se încarcă în paralel cu prima pagină de căutare, nu la primul anunț
+    llm_client = get_ollama_client()
+    llm_before = llm_client.timings_snapshot()
+    if settings.OLLAMA_WARMUP:
+        # în modul pe faze judge_model se încarcă abia în faza 2
+        llm_client.warm_up_async([model] if settings.LLM_PHASED else [model, settings.JUDGE_MODEL])
+
+    rt = runtime or ProfileRuntime.load(profile_id)
+    lock = threading.Condition()
+    counts = {"accepted": 0, "collected": 0, "judging": 0}
+    enough = threading.Event()  # s-a atins max_ads: nu mai alimentăm pipeline-ul
+    pages_done: set[int] = set()
+    pending: list[str] = []
+    if checkpoint is not None:
+        pages_done = checkpoint.pages_done()
+        pending = checkpoint.pending_urls()
+        counts["accepted"] = checkpoint.saved_count()
+        if counts["accepted"] >= limit_ads:
+            enough.set()
+
+    def stopping() -> bool:
+        # max_ads atins sau run anulat: nu mai alimentăm / nu mai consumăm din pipeline
+        if checkpoint is not None and checkpoint.cancelled:
+            enough.set()
+        return enough.is_set()
+
+    if fetch_mode == "replay":
+        session = ReplaySession(store)
+    else:
+        service = get_browser()
+        session = service.session(concurrency=settings.AD_FETCH_CONCURRENCY)
+        bm = service.metrics()
+        live.kv("browser", f"launches={bm['launches']} last_launch_s={bm['last_launch_s']} rss_mb={bm['rss_mb']}")
+
+    with session as browser:
+        fetcher = HttpFetcher(browser) if fetch_mode == "http" else browser
+
+        def fetch_stage(url: str):
+            if stopping():
+                return None
+            html = fetcher.fetch(url, timeout_ms=30000)
+            sha, fetched_at = snap(url, html)
+            return {"url": url, "html": html, "snapshot_sha": sha, "snapshot_at": fetched_at}
+
+        def parse_stage(it: dict):
+            if stopping():
+                return None
+            item = parse_ad(it["url"], it["html"], live)
+            item["snapshot_sha"], item["snapshot_at"] = it["snapshot_sha"], it["snapshot_at"]
+            return item
+
+        def llm_stage(item: dict):
+            # limita max_ads se aplică înainte de LLM (cel mai scump pas); cu mai mulți
+            # workeri, un anunț intră la LLM doar dacă mai e loc după cele aflate deja în lucru
+            if stopping():
+                return None
+            with lock:
+                while counts["accepted"] + counts["judging"] >= limit_ads and counts["accepted"] < limit_ads:
+                    lock.wait(1.0)
+                    if stopping():
                         return None
-
-                    def apply_cfg_soft_filters(cfg: dict, title: str, desc: str, price: int | None,
-                                               dist_km: float | None):
-                        """
-                        - avoid: HARD (drop)
-                        - max_price/radius: soft cu toleranță, hard drop doar dacă e MULT peste
-                        - must_have: SOFT (bonus dacă apare, mic penalty dacă lipsește)
-                        """
-                        text = (title or "") + "\n" + (desc or "")
-
-                        # 1) HARD negatives (avoid)
-                        avoid_hit = contains_any(text, cfg.get("avoid") or [])
-                        if avoid_hit:
-                            return {"drop": True, "reason": f"cfg_avoid:{avoid_hit}", "bonus": 0.0}
-
-                        bonus = 0.0
-
-                        # 2) price soft/hard
-                        max_price = cfg.get("max_price_ron")
+                if counts["accepted"] >= limit_ads:
+                    return None
+                counts["judging"] += 1
+            ad = None
+            try:
+                ad = judge_ad(item, model, rt, live, defer_judge=phased)
+            finally:
+                with lock:
+                    counts["judging"] -= 1
+                    if ad is not None:
+                        counts["accepted"] += 1
+                        if counts["accepted"] >= limit_ads:
+                            enough.set()
+                    lock.notify_all()
+            if ad is None:
+                if checkpoint is not None:
+                    checkpoint.mark(item["url"], "dropped")
+                return None
+            return ad
+
+        def db_stage(ad: dict):
+            upsert_ad(ad)
+            if checkpoint is not None:
+                # 'judging' = salvat doar cu minimal; nu e stare finală => la resume se reia
+                checkpoint.mark(ad["url"], "judging" if "_judge" in ad else "saved")
+            # “collected” = câte am procesat, nu câte au trecut strict
+            with lock:
+                counts["collected"] += 1
+                if "_judge" in ad:
+                    ad["_judge"]["checkpoint"] = checkpoint
+                    deferred.append(ad)
+            return None
+
+        def on_error(stage: str, item, err: Exception):
+            live.section(f"{stage.upper()} ERROR")
+            if isinstance(item, dict):
+                live.kv("url", item.get("url"))
+            elif isinstance(item, str):
+                live.kv("url", item)
+            live.kv("error", trunc(str(err), 300))
+            url = item.get("url") if isinstance(item, dict) else item
+            if checkpoint is not None and stage != "search" and isinstance(url, str):
+                checkpoint.mark(url, "error", f"{stage}: {trunc(str(err), 300)}")
+
+        pipe = Pipeline(run_id=run_id, on_error=on_error)
+        pipe.stage("fetch", fetch_stage, workers=settings.AD_FETCH_CONCURRENCY, maxsize=settings.PIPELINE_QUEUE_SIZE)
+        pipe.stage("parse", parse_stage, workers=settings.PIPELINE_PARSE_WORKERS, maxsize=settings.PIPELINE_QUEUE_SIZE)
+        # câte apeluri Ollama pot rula simultan pe toate endpoint-urile din pool
+        llm_workers = max(settings.PIPELINE_LLM_WORKERS, get_ollama_pool().capacity())
+        # faze pe model: întâi intent + minimal pentru toate anunțurile, apoi verbose
+        # (judge_model), ca Ollama să nu comute modelele la fiecare anunț
+        phased = settings.LLM_PHASED and settings.JUDGE_MODEL != model
+        pipe.stage("llm", llm_stage, workers=llm_workers, maxsize=settings.PIPELINE_QUEUE_SIZE)
+        pipe.stage("db", db_stage, workers=1, maxsize=settings.PIPELINE_QUEUE_SIZE)
+
+        def search_pages():
+            """
+            Pagina 1 prin browser; dacă paginarea e lizibilă, paginile 2..N se cer
+            direct (?page=N) în paralel. Altfel: click pe "next", ca înainte.
+            Yield (număr pagină, SearchPage); paginile din checkpoint nu se mai cer.
+            """
+            browser.open_search(search_url)
+            html = browser.search_html()
+            snap(search_url, html)
+            first = SearchPage(html, settings.OLX_BASE)
+            yield 1, first
+
+            last = min(max_pages, first.page_count or 0)
+            if first.page_count:
+                numbers = [n for n in range(2, last + 1) if n not in pages_done]
+                urls = [search_page_url(query, n, newest=watch) for n in numbers]
+                if watch:
+                    # de obicei ne oprim pe pagina 1-2 => paginile următoare doar la cerere
+                    for n, url in zip(numbers, urls):
                         try:
-                            max_price = int(max_price) if max_price is not None else None
-                        except Exception:
-                            max_price = None
-
-                        if max_price and price:
-                            # wiggle room: +15% soft, peste +35% drop (tune aici)
-                            soft = 1.15
-                            hard = 1.35
-                            if price > max_price * hard:
-                                return {"drop": True, "reason": "over_budget_hard", "bonus": 0.0}
-                            if price > max_price:
-                                # penalty gradual, max ~ -2.0
-                                ratio = (price - max_price) / max_price
-                                bonus -= min(2.0, ratio * 10.0)  # 10% peste => -1.0
-                            else:
-                                bonus += 0.4  # sub buget = mic bonus
-
-                        # 3) radius soft/hard (doar dacă ai distanță)
-                        radius = cfg.get("radius_km")
-                        try:
-                            radius = float(radius) if radius is not None else None
-                        except Exception:
-                            radius = None
-
-                        if radius and dist_km:
-                            soft = 1.20
-                            hard = 1.60
-                            if dist_km > radius * hard:
-                                return {"drop": True, "reason": "over_radius_hard", "bonus": 0.0}
-                            if dist_km > radius:
-                                ratio = (dist_km - radius) / radius
-                                bonus -= min(1.5, ratio * 5.0)  # 20% peste => -1.0
-                            else:
-                                bonus += 0.3
-
-                        # 4) must_have: SOFT
-                        must = cfg.get("must_have") or []
-                        if must:
-                            hit = contains_any(text, must)
-                            if hit:
-                                bonus += 0.8
-                            else:
-                                bonus -= 0.4  # nu omori anunțul, doar îl împingi în jos
-
-                        return {"drop": False, "reason": None, "bonus": bonus}
-
-                    # 1) intent
-                    intent = classify_intent(model, title or "", desc or "", stream_cb=stream_cb)
-                    live_section("INTENT")
-                    live_kv("intent", intent)
-                    live_kv("domain", domain)
-
-                    # stricte: domain-level exclude (rămân hard)
-                    if domain == "rentals_cabins":
-                        if intent != "RENTAL":
-                            live_section("DROP")
-                            live_kv("reason", "intent_mismatch_for_rentals")
-                            # (nu salvăm anunțuri irelevante pt rentals)
-                            continue
-
-                    elif domain == "electronics_tv_flip":
-                        if intent == "OFFER_SERVICE":
-                            live_section("DROP")
-                            live_kv("reason", "service_ad_excluded")
-                            # (nu salvăm servicii)
+                            html = browser.fetch(url, timeout_ms=30000)
+                        except Exception as e:
+                            on_error("search", url, e)
+                            return
+                        snap(url, html)
+                        yield n, SearchPage(html, settings.OLX_BASE)
+                    return
+                pages = browser.fetch_many(urls, timeout_ms=30000, concurrency=settings.SEARCH_PAGE_CONCURRENCY)
+                try:
+                    for n, (url, html, err) in zip(numbers, pages):
+                        if err is not None:
+                            on_error("search", url, err)
                             continue
+                        snap(url, html)
+                        yield n, SearchPage(html, settings.OLX_BASE)
+                finally:
+                    pages.close()
+                return
 
-                    # 2) keyword bonus
-                    kb = keyword_score((title or "") + "\n" + (desc or ""), hard_yes, hard_no)
-                    live_section("KEYWORD SCORE")
-                    live_kv("keyword_bonus", kb)
-                    cfg_res = apply_cfg_soft_filters(cfg, title or "", desc or "", price, dist)
-
-                    if cfg_res["drop"]:
-                        section("DROP")
-                        kv("reason", cfg_res["reason"])
+            for n in range(2, max_pages + 1):
+                try:
+                    if not browser.next_search_page():
+                        return
+                    html = browser.search_html()
+                except Exception as e:
+                    # navigarea nu s-a terminat: nu recitim pagina veche, ne oprim aici
+                    on_error("search", search_page_url(query, n, newest=watch), e)
+                    return
+                snap(search_page_url(query, n, newest=watch), html)
+                yield n, SearchPage(html, settings.OLX_BASE)
+
+        with pipe:
+            if pending:
+                # reluare: URL-urile rămase în zbor / cu eroare la oprirea run-ului
+                live.kv("resumed_pending", len(pending))
+                for url in pending:
+                    if stopping() or not pipe.put(url):
+                        break
+            if pages_done:
+                live.kv("resumed_pages_done", sorted(pages_done))
+
+            pages = search_pages()
+            for page_no, sp in pages:
+                if stopping():
+                    break
+                if page_no in pages_done:
+                    continue
+                cards = sp.cards
+                reached_seen = False
+                if watch:
+                    if not head:
+                        head = [c["url"] for c in cards[:settings.WATCH_HEAD_SIZE]]
+                    page_urls = [c["url"] for c in cards]
+                    # doar ce e din pass-urile anterioare oprește paginarea: anunțurile tratate
+                    # în acest pass de alt query (deja în watch_seen / ads) se sar mai jos, dar
+                    # nu intră în șir, altfel ar ascunde anunțurile noi de după ele
+                    earlier = get_watch_seen(profile_id, page_urls) | set(get_seen_ads(page_urls))
+                    known = head_urls | (earlier - seen_urls)
+                    cards, reached_seen = watch_new_cards(cards, known, settings.WATCH_STOP_AFTER_SEEN)
+                    live.kv("watch_new", f"{len(cards)}/{len(page_urls)}" + (" (reached seen ads)" if reached_seen else ""))
+                links = [c["url"] for c in cards]
+
+                # deja văzute în acest run (altă pagină / alt query)
+                dup = [u for u in links if u in seen_urls]
+                if dup:
+                    live.kv("skipped_seen_in_run", f"{len(dup)}/{len(links)}")
+                    links = [u for u in links if u not in seen_urls]
+                seen_urls.update(links)
+
+                # anunțuri deja cunoscute (și proaspete) => fără browser, fără LLM;
+                # replay e chiar pentru re-analiză, deci acolo se reiau toate
+                fresh = known_fresh_urls(links) if fetch_mode != "replay" else set()
+                if fresh:
+                    live.kv("skipped_known", f"{len(fresh)}/{len(links)}")
+                    links = [u for u in links if u not in fresh]
+
+                # drop-uri sigure direct din card (hard_no, avoid, buget, rază)
+                dropped = Counter()
+                todo, keep = set(links), []
+                for c in cards:
+                    if c["url"] not in todo:
                         continue
-
-                    cfg_bonus = cfg_res["bonus"]
-                    section("CFG SCORE")
-                    kv("cfg_bonus", cfg_bonus)
-
-                    analysis = analyze_ad(
-                        model=model,
-                        judge_model="deepseek-r1:8b",
-                        title=title or "",
-                        description=desc or "",
-                        price_ron=price,
-                        verbose_threshold=5.0,
-                        keyword_bonus=kb + cfg_bonus,
-                        domain=domain,
-                        stream_cb=stream_cb,
-                    )
-
-                    minimal = analysis["minimal"]
-                    verbose = analysis["verbose"]
-
-                    # --- Decide save vs soft drop ---
-                    save_strict = True
-                    if domain == "rentals_cabins":
-                        try:
-                            score = float(minimal.get("score", 0))
-                            scam = float(minimal.get("scam_risk", 10))
-                        except Exception:
-                            score, scam = 0, 10
-                        save_strict = (score >= 7.0 and scam <= 5.0 and minimal.get("verdict") != "NU MERITĂ")
-
-                    elif domain == "electronics_tv_flip":
-                        try:
-                            score = float(minimal.get("score", 0))
-                        except Exception:
-                            score = 0
-                        verdict = (minimal.get("verdict") or "").upper()
-                        save_strict = (score >= 7.0 and verdict in {"MERITĂ", "MERITĂ LA PIESE"})
-
-                    # ✅ tu ai zis: să nu mai “dispară” — deci salvăm și soft-drop
-                    soft_drop_reason = None
-                    if not save_strict:
-                        live_section("DROP")
-                        live_kv("reason", "not_good_enough_after_analysis")
-                        live_kv("score", minimal.get("score"))
-                        live_kv("verdict", minimal.get("verdict"))
-                        soft_drop_reason = f"[SOFT DROP] not_good_enough_after_analysis | score={minimal.get('score')} | verdict={minimal.get('verdict')}"
-
-                    if "judge_error" in minimal:
-                        live_section("JUDGE ERROR (fallback to minimal)")
-                        live_kv("error", minimal["judge_error"])
-
-                    from datetime import timezone
-
-                    ad = {
-                        "profile_id": profile_id,
-                        "url": url,
-                        "title": title or "",
-                        "description": desc or "",
-                        "location_text": loc or "",
-                        "image_url": img or "",
-                        "price_ron": int(price) if price is not None else None,
-                        "distance_km": float(dist) if dist is not None else None,
-                        "lat": float(lat) if lat is not None else None,
-                        "lon": float(lon) if lon is not None else None,
-                        "scraped_at": datetime.now(timezone.utc).isoformat(),
-                    }
-
-                    ad.update({
-                        "score": float(minimal.get("score", 5.0)),
-                        "verdict": minimal.get("verdict", ""),
-                        "likely_fix": minimal.get("likely_fix", ""),
-                        "repair_estimate_low": int(minimal.get("repair_estimate_low", 0) or 0),
-                        "repair_estimate_high": int(minimal.get("repair_estimate_high", 0) or 0),
-                        "parts_suspected": minimal.get("parts_suspected", ""),
-                        "reasoning": minimal.get("reasoning_short", ""),
-                    })
-
-                    # parse_ok heuristic
-                    ad["parse_ok"] = 0 if (minimal.get("reasoning_short", "").startswith("Fallback")) else 1
-
-                    # verbose fields
-                    if verbose:
-                        ad["confidence"] = float(verbose.get("confidence", 0.5))
-                        ad["signals_positive"] = json.dumps(verbose.get("signals_positive", []), ensure_ascii=False)
-                        ad["signals_negative"] = json.dumps(verbose.get("signals_negative", []), ensure_ascii=False)
-                        ad["quick_tests"] = json.dumps(verbose.get("quick_tests", []), ensure_ascii=False)
-                        ad["repair_items"] = json.dumps(verbose.get("repair_items", []), ensure_ascii=False)
-                        ad["resale_value_low"] = int(verbose.get("resale_value_low", 0) or 0)
-                        ad["resale_value_high"] = int(verbose.get("resale_value_high", 0) or 0)
-                        ad["profit_low"] = int(verbose.get("profit_low", 0) or 0)
-                        ad["profit_high"] = int(verbose.get("profit_high", 0) or 0)
-                        n = verbose.get("notes", "")
-                        if isinstance(n, (list, dict)):
-                            n = json.dumps(n, ensure_ascii=False)
-                        ad["notes"] = n
-                        ad["drive_time_min"] = None
+                    reason = rt.card_drop(c)
+                    if reason:
+                        dropped[reason.split(":")[0]] += 1
                     else:
-                        ad["confidence"] = None
-                        ad["signals_positive"] = None
-                        ad["signals_negative"] = None
-                        ad["quick_tests"] = None
-                        ad["repair_items"] = None
-                        ad["resale_value_low"] = None
-                        ad["resale_value_high"] = None
-                        ad["profit_low"] = None
-                        ad["profit_high"] = None
-                        ad["drive_time_min"] = None
-                        ad["notes"] = ""
-
-                    if "judge_error" in minimal:
-                        ad["judge_error"] = minimal["judge_error"]
-                    else:
-                        ad["judge_error"] = None
-
-                    if soft_drop_reason:
-                        # nu avem coloană “drop_reason” în DB, deci o punem în notes
-                        ad["notes"] = (ad.get("notes") or "").strip()
-                        ad["notes"] = (ad["notes"] + "\n" + soft_drop_reason).strip()
-
-                    upsert_ad(ad)
-
-                    # “collected” = câte am procesat, nu câte au trecut strict
-                    collected += 1
-
-                finally:
-                    ad_page.close()
-
-            next_btn = page.query_selector("a[rel='next']")
-            if not next_btn:
-                break
-            next_btn.click()
-            time.sleep(settings.MIN_SECONDS_BETWEEN_PAGES)
-
-        context.close()
-        browser.close()
+                        keep.append(c["url"])
+                if dropped:
+                    saved = sum(dropped.values())
+                    prefiltered += saved
+                    live.kv("prefilter_saved", f"{saved}/{len(links)} " + ", ".join(f"{k}={v}" for k, v in dropped.items()))
+                    links = keep
+
+                if checkpoint is not None:
+                    # înregistrate înainte de put: o oprire bruscă le lasă 'queued' => se reiau
+                    checkpoint.mark([c["url"] for c in cards if c["url"] in todo and c["url"] not in keep], "prefiltered")
+                    checkpoint.mark(links, "queued")
+                    checkpoint.page_done(page_no)
+
+                queued = []
+                for url in links:
+                    if stopping() or not pipe.put(url):
+                        break
+                    queued.append(url)
+
+                if watch:
+                    # prefiltrate + trimise în pipeline = tratate; pass-ul următor nu le mai ia
+                    handled = queued + [c["url"] for c in cards if c["url"] in todo and c["url"] not in keep]
+                    add_watch_seen(profile_id, handled)
+                    new_in_pass += len(queued)
+
+                if stopping() or reached_seen:
+                    break
+            pages.close()
+
+        if own_phase and deferred:
+            judge_phase(deferred, live, llm_workers)
+
+        if isinstance(fetcher, HttpFetcher):
+            live.section("FETCH")
+            for k, v in sorted(fetcher.stats_snapshot().items()):
+                live.kv(k, v)
+
+        net = browser.net_stats()
+        if net:
+            live.section("NETWORK")
+            live.kv("allowed", f"{net.get('allowed', 0)} req / {net.get('allowed_bytes', 0) / 1024:.0f} KB")
+            live.kv("blocked", net.get("blocked", 0))
+            for k, v in sorted(net.items()):
+                if k.startswith("blocked:"):
+                    live.kv(k, v)
+
+    if watch and head:
+        # high-water mark = doar anunțurile din cap deja tratate (oprirea la max_ads
+        # poate lăsa anunțuri noi netrimise; ele rămân noi pentru pass-ul următor)
+        handled = get_watch_seen(profile_id, head) | set(get_seen_ads(head))
+        head = [u for u in head if u in handled]
+        save_watch_state(profile_id, query, head, new_in_pass)
+        live.section("WATCH")
+        live.kv("new_ads", new_in_pass)
+        live.kv("high_water_mark", head[0] if head else None)
+
+    if store is not None:
+        snap_after = store.stats_snapshot()
+        snap_delta = {k: v - snap_before.get(k, 0) for k, v in snap_after.items() if v - snap_before.get(k, 0)}
+        if snap_delta:
+            live.section("SNAPSHOTS")
+            for k, v in sorted(snap_delta.items()):
+                live.kv(k, v)
+
+    for m, t in sorted(llm_client.timings_snapshot().items()):
+        d = {k: v - llm_before.get(m, {}).get(k, 0) for k, v in t.items()}
+        if d.get("calls") or d.get("warmups"):
+            live.section(f"LLM {m}")
+            live.kv("calls", d.get("calls", 0))
+            live.kv("load_s", round(d.get("load_duration", 0) / 1e9, 2))
+            live.kv("generate_s", round((d.get("prompt_eval_duration", 0) + d.get("eval_duration", 0)) / 1e9, 2))
+
+    limits = rate_limit_metrics()
+    if limits:
+        live.section("RATE LIMIT")
+        for host, m in sorted(limits.items()):
+            live.kv(host, f"{m['rate']}/s, waits {m['waits']} ({m['wait_s']}s), backoffs {m['backoffs']}")
+
+    if prefiltered:
+        live.section("PREFILTER")
+        live.kv("ads_saved", prefiltered)
+
+    stats = extract_stats()
+    delta = {k: stats[k] - stats_before.get(k, 0) for k in stats if stats[k] - stats_before.get(k, 0)}
+    if delta.get("docs"):
+        live.section("EXTRACT")
+        live.kv("docs", delta.pop("docs"))
+        live.kv("dom_parse", delta.pop("dom_parse", 0))
+        for k, v in sorted(delta.items()):
+            live.kv(k, v)
+
+    return counts["collected"]
+
+
+if __name__ == "__main__":
+    import argparse
+    from queries import QUERIES
+    from db import get_profile
+
+    ap = argparse.ArgumentParser(description="OLX scrape + analiză LLM (CLI)")
+    ap.add_argument("--profile", type=int, default=None, help="id profil (altfel: queries.py)")
+    ap.add_argument("--query", action="append", default=None, help="query explicit (repetabil)")
+    ap.add_argument("--model", default=settings.DEFAULT_MODEL)
+    ap.add_argument("--pages", type=int, default=None)
+    ap.add_argument("--max-ads", type=int, default=None)
+    ap.add_argument("--fetch-mode", choices=FETCH_MODES, default=None)
+    ap.add_argument("--watch", action="store_true", help="doar anunțuri noi, repetat la --interval minute")
+    ap.add_argument("--interval", type=float, default=settings.WATCH_INTERVAL_MIN, help="minute între pass-uri (--watch)")
+    ap.add_argument("--resume", default=None, metavar="RUN_ID", help="reia un run întrerupt (checkpoint din DB)")
+    ap.add_argument("--snapshots", action="store_true", default=None, help="salvează HTML-ul paginilor în snapshot store")
+    args = ap.parse_args()
 
-    return collected
+    init_db()
+    from runs import new_run, execute_run
+
+    if args.resume:
+        section("RESUME")
+        kv("run_id", args.resume)
+        total = execute_run(args.resume, emit_events=False)
+    else:
+        prof = get_profile(args.profile) if args.profile is not None else None
+        queries = args.query or (prof["queries"] if prof else QUERIES)
+
+        if args.watch:
+            from watch import Watcher
+            w = Watcher(args.profile, args.model, interval_min=args.interval, max_pages=args.pages, max_ads=args.max_ads,
+                        fetch_mode=args.fetch_mode, queries=queries)
+            try:
+                w.run_forever()
+            except KeyboardInterrupt:
+                pass
+            raise SystemExit(0)
+
+        run_id = new_run(args.profile, args.model, queries, pages=args.pages, max_ads=args.max_ads,
+                         fetch_mode=args.fetch_mode, snapshots=args.snapshots)
+        section("RUN")
+        kv("run_id", run_id)
+        kv("resume", f"python scrape.py --resume {run_id}")
+        total = execute_run(run_id, emit_events=False)
+
+    section("DONE")
+    kv("collected", total)
+    kv("browser", get_browser().metrics())
@@ -0,0 +1,223 @@
+# snapshots.py
+import gzip
+import hashlib
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from config import settings
+from db import connect
+
+
+def _now_utc():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SnapshotStore:
+    """
+    HTML brut al paginilor descărcate, comprimat (gzip) și adresat prin conținut:
+    fișierul e sha256(html).html.gz, deci o pagină identică se scrie o singură dată.
+
+    În SQLite: `snapshots` (sha, mărimi, ultima folosire) și `snapshot_urls`
+    (url -> ultimul sha + momentul fetch-ului). Peste max_mb se șterg snapshot-urile
+    folosite cel mai demult.
+    """
+
+    def __init__(self, root: str | Path | None = None, max_mb: float | None = None):
+        self.root = Path(root or settings.SNAPSHOT_DIR)
+        self.max_bytes = int((max_mb if max_mb is not None else settings.SNAPSHOT_MAX_MB) * 1024 * 1024)
+        self.stats = Counter()
+        self._lock = threading.Lock()        # stats
+        self._evict_lock = threading.Lock()  # o singură evacuare odată
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sha: str) -> Path:
+        return self.root / sha[:2] / f"{sha}.html.gz"
+
+    def put(self, url: str, html: str) -> tuple[str, str]:
+        """Salvează pagina; întoarce (sha, fetched_at)."""
+        raw = (html or "").encode("utf-8")
+        sha = hashlib.sha256(raw).hexdigest()
+        fetched_at = _now_utc()
+        path = self._path(sha)
+
+        with connect() as con:
+            known = con.execute("SELECT 1 FROM snapshots WHERE sha=?", (sha,)).fetchone() is not None
+        if known and path.exists():
+            self._count("dedup")
+        else:
+            data = gzip.compress(raw, compresslevel=settings.SNAPSHOT_GZIP_LEVEL)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            with connect() as con:
+                con.execute("""
+                    INSERT OR REPLACE INTO snapshots (sha, size_raw, size_gz, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (sha, len(raw), len(data), fetched_at, fetched_at))
+                con.commit()
+            self._count("written")
+            self._count("bytes_raw", len(raw))
+            self._count("bytes_gz", len(data))
+
+        with connect() as con:
+            con.execute("UPDATE snapshots SET last_used_at=? WHERE sha=?", (fetched_at, sha))
+            con.execute("""
+                INSERT INTO snapshot_urls (url, sha, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET sha=excluded.sha, fetched_at=excluded.fetched_at
+            """, (url, sha, fetched_at))
+            con.commit()
+
+        if not known:
+            self.evict()
+        return sha, fetched_at
+
+    def get(self, sha: str) -> str | None:
+        try:
+            data = self._path(sha).read_bytes()
+        except FileNotFoundError:
+            return None
+        with connect() as con:
+            con.execute("UPDATE snapshots SET last_used_at=? WHERE sha=?", (_now_utc(), sha))
+            con.commit()
+        return gzip.decompress(data).decode("utf-8")
+
+    def sha_for_url(self, url: str) -> str | None:
+        with connect() as con:
+            r = con.execute("SELECT sha FROM snapshot_urls WHERE url=?", (url,)).fetchone()
+            return r[0] if r else None
+
+    def get_url(self, url: str) -> str | None:
+        """Ultimul snapshot pentru URL (None dacă lipsește sau a fost evacuat)."""
+        sha = self.sha_for_url(url)
+        return self.get(sha) if sha else None
+
+    def has_url(self, url: str) -> bool:
+        sha = self.sha_for_url(url)
+        return bool(sha) and self._path(sha).exists()
+
+    def total_bytes(self) -> int:
+        with connect() as con:
+            return con.execute("SELECT COALESCE(SUM(size_gz), 0) FROM snapshots").fetchone()[0]
+
+    def evict(self) -> int:
+        """Șterge snapshot-urile folosite cel mai demult până sub max_bytes. Întoarce câte."""
+        if self.max_bytes <= 0:
+            return 0
+        with self._evict_lock:
+            total = self.total_bytes()
+            if total <= self.max_bytes:
+                return 0
+            removed = []
+            with connect() as con:
+                for sha, size in con.execute("SELECT sha, size_gz FROM snapshots ORDER BY last_used_at ASC"):
+                    if total <= self.max_bytes:
+                        break
+                    try:
+                        self._path(sha).unlink()
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    removed.append(sha)
+                con.executemany("DELETE FROM snapshots WHERE sha=?", [(s,) for s in removed])
+                con.executemany("DELETE FROM snapshot_urls WHERE sha=?", [(s,) for s in removed])
+                con.commit()
+            self._count("evicted", len(removed))
+            return len(removed)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+class ReplaySession:
+    """
+    Înlocuiește BrowserSession în fetch_mode="replay": paginile (căutare + anunțuri)
+    vin din SnapshotStore, fără rețea. Paginarea "next" urmează URL-urile ?page=N.
+    """
+
+    def __init__(self, store: SnapshotStore):
+        self.store = store
+        self._search_url: str | None = None
+        self._page = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+    def close(self):
+        pass
+
+    def fetch(self, url: str, timeout_ms: int = 30000) -> str:
+        html = self.store.get_url(url)
+        if html is None:
+            raise LookupError(f"no snapshot for {url}")
+        return html
+
+    def fetch_many(self, urls: list[str], timeout_ms: int = 30000,
+                   concurrency: int | None = None) -> Iterator[tuple[str, str | None, Exception | None]]:
+        for url in urls:
+            try:
+                yield url, self.fetch(url), None
+            except LookupError as e:
+                yield url, None, e
+
+    def net_stats(self) -> dict:
+        return {}
+
+    def _page_url(self, page: int) -> str:
+        if page <= 1:
+            return self._search_url
+        return f"{self._search_url}{'&' if '?' in self._search_url else '?'}page={page}"
+
+    def open_search(self, url: str):
+        self._search_url, self._page = url, 1
+
+    def search_html(self) -> str:
+        return self.fetch(self._page_url(self._page))
+
+    def next_search_page(self) -> bool:
+        if not self.store.has_url(self._page_url(self._page + 1)):
+            return False
+        self._page += 1
+        return True
+
+
+_store: SnapshotStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore()
+        return _store
+
+
+if __name__ == "__main__":
+    import argparse
+    from db import init_db
+
+    ap = argparse.ArgumentParser(description="Snapshot store (HTML brut comprimat)")
+    ap.add_argument("cmd", choices=["stats", "evict"])
+    args = ap.parse_args()
+
+    init_db()
+    store = get_snapshot_store()
+    if args.cmd == "evict":
+        print("evicted", store.evict())
+    with connect() as con:
+        n, raw, gz = con.execute("SELECT COUNT(*), COALESCE(SUM(size_raw), 0), COALESCE(SUM(size_gz), 0) FROM snapshots").fetchone()
+        urls = con.execute("SELECT COUNT(*) FROM snapshot_urls").fetchone()[0]
+    print(f"snapshots={n} urls={urls} raw={raw / 1e6:.1f}MB gz={gz / 1e6:.1f}MB limit={store.max_bytes / 1e6:.0f}MB")
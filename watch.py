@@ -0,0 +1,125 @@
+# watch.py
+import threading
+from datetime import datetime, timezone
+
+from config import settings
+from db import get_profile, prune_watch_seen
+from events import emit, close_run
+from log import section, kv
+from profile_runtime import ProfileRuntime
+from scrape import scrape, judge_phase, LiveLog
+
+
+class Watcher:
+    """
+    Rulează periodic toate query-urile unui profil în watch mode (newest-first,
+    doar anunțurile noi). Un pass la `interval_min` minute, până la stop().
+    Profilul se recitește la fiecare pass, deci editările intră din pass-ul următor.
+    """
+
+    def __init__(self, profile_id: int | None, model: str, interval_min: float | None = None,
+                 max_pages: int | None = None, max_ads: int | None = None, fetch_mode: str | None = None,
+                 queries: list[str] | None = None, run_id: str | None = None):
+        self.profile_id = profile_id
+        self.model = model
+        self.interval_min = interval_min or settings.WATCH_INTERVAL_MIN
+        self.max_pages = max_pages
+        self.max_ads = max_ads
+        self.fetch_mode = fetch_mode
+        self.queries = queries
+        self.run_id = run_id
+        self.passes = 0
+        self.last_pass_at: str | None = None
+        self.last_collected = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_pass(self) -> int:
+        prof = get_profile(self.profile_id) if self.profile_id is not None else None
+        queries = self.queries or (prof["queries"] if prof else [])
+        rt = ProfileRuntime.from_profile(prof, self.profile_id)
+        seen: set[str] = set()
+        deferred: list[dict] = []  # LLM_PHASED: un singur judge phase per pass
+        total = 0
+
+        self.passes += 1
+        emit(self.run_id, "section", {"title": f"WATCH PASS {self.passes}"})
+        for q in queries:
+            if self._stop.is_set():
+                break
+            total += scrape(query=q, model=self.model, profile_id=self.profile_id, max_pages=self.max_pages,
+                            max_ads=self.max_ads, run_id=self.run_id, fetch_mode=self.fetch_mode,
+                            seen_urls=seen, runtime=rt, watch=True, deferred=deferred)
+        if deferred:
+            judge_phase(deferred, LiveLog(self.run_id))
+        prune_watch_seen(settings.WATCH_SEEN_TTL_DAYS)
+
+        self.last_pass_at = datetime.now(timezone.utc).isoformat()
+        self.last_collected = total
+        emit(self.run_id, "kv", {"key": "watch_collected", "value": total})
+        return total
+
+    def run_forever(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_pass()
+                except Exception as e:
+                    section("WATCH ERROR")
+                    kv("error", str(e))
+                    emit(self.run_id, "kv", {"key": "watch_error", "value": str(e)})
+                self._stop.wait(self.interval_min * 60)
+        finally:
+            close_run(self.run_id)
+
+    def start(self) -> "Watcher":
+        self._thread = threading.Thread(target=self.run_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "model": self.model,
+            "interval_min": self.interval_min,
+            "passes": self.passes,
+            "last_pass_at": self.last_pass_at,
+            "last_collected": self.last_collected,
+            "running": self.running,
+            "run_id": self.run_id,
+        }
+
+
+_watchers: dict[int | None, Watcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def start_watch(profile_id: int | None, model: str, **kwargs) -> Watcher:
+    """Un singur watcher per profil: un watcher nou îl înlocuiește pe cel vechi."""
+    with _watchers_lock:
+        old = _watchers.get(profile_id)
+        if old is not None:
+            old.stop()
+        w = _watchers[profile_id] = Watcher(profile_id, model, **kwargs).start()
+        return w
+
+
+def stop_watch(profile_id: int | None) -> bool:
+    with _watchers_lock:
+        w = _watchers.pop(profile_id, None)
+    if w is None:
+        return False
+    w.stop()
+    return True
+
+
+def list_watches() -> list[dict]:
+    with _watchers_lock:
+        return [w.status() for w in _watchers.values()]